@@ -0,0 +1,520 @@
+# Versão assíncrona (ASGI) da API: Starlette + AsyncWeb3, mesmas rotas e respostas de `main.py`
+#
+#   python asgi.py                         (ou: uvicorn asgi:app --host 0.0.0.0 --port 5000)
+#
+# Os nonces são alocados no processo, então cada conta que assina (controller, egress) só pode ser
+# usada por um worker: o servidor roda sempre com um único worker. A concorrência vem do event loop, não de processos.
+
+import asyncio
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from time import time
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from web3 import AsyncHTTPProvider, AsyncWeb3
+from web3.exceptions import Web3RPCError
+
+from shared import (
+    BLOCKCHAIN_HOST,
+    PROBE_KEYS,
+    RECEIPT_MAX_AGE,
+    RECEIPT_POLL_INTERVAL,
+    ReadCache,
+    abi_args,
+    build_call_templates,
+    build_tx_templates,
+    chunked,
+    compliance_history_response,
+    compliance_response,
+    dropped_status,
+    flow_request_error,
+    controller_address,
+    egress_address,
+    history_page,
+    history_requests,
+    history_result,
+    is_known_tx_error,
+    is_nonce_error,
+    load_contract_data,
+    parse_batch,
+    private_keys,
+    probe_batches,
+    probe_error,
+    probe_keys,
+    receipt_status,
+    with_item_errors,
+)
+
+# Conexões HTTP mantidas com o nó (aiohttp)
+RPC_POOL_SIZE = int(os.getenv('RPC_POOL_SIZE', '100'))
+RPC_TIMEOUT = float(os.getenv('RPC_TIMEOUT', '30'))
+
+
+def rpc_error_message(e):
+    return e.rpc_response['error']['message']
+
+
+# Alocador de nonces de uma conta. Só a alocação é serializada: as transações são assinadas e
+# enviadas em paralelo. Se um envio falhar, o próximo nonce é relido do nó (`pending` para no
+# primeiro buraco, que a próxima transação preenche).
+class AsyncNonceManager:
+    def __init__(self, w3, address, private_key):
+        self.w3 = w3
+        self.address = address
+        self.private_key = private_key
+        self.lock = asyncio.Lock()
+        self.next_nonce = None
+
+    async def allocate(self, n=1):
+        async with self.lock:
+            if self.next_nonce is None:
+                self.next_nonce = await self.w3.eth.get_transaction_count(self.address, 'pending')
+            first = self.next_nonce
+            self.next_nonce += n
+            return first
+
+    async def invalidate(self):
+        async with self.lock:
+            self.next_nonce = None
+
+    async def send_with_nonce(self, build_tx, nonce):
+        signed_tx = self.w3.eth.account.sign_transaction(build_tx(nonce), self.private_key)
+        try:
+            return await self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Web3RPCError as e:
+            if not is_known_tx_error(rpc_error_message(e)):
+                raise
+            # Já está no nó: o hash é o da transação assinada
+            return signed_tx.hash
+
+    async def send(self, build_tx):
+        """Assina e envia `build_tx(nonce)`. Retorna o hash da transação"""
+        for retry in (False, True):
+            nonce = await self.allocate()
+            try:
+                return await self.send_with_nonce(build_tx, nonce)
+            except Exception as e:
+                # Não se sabe onde o nonce parou: é relido do nó
+                await self.invalidate()
+                if retry or not isinstance(e, Web3RPCError) or not is_nonce_error(rpc_error_message(e)):
+                    raise
+                print(f"--> Nonce {nonce} de {self.address} fora de sincronia: {rpc_error_message(e)}")
+
+    async def send_many(self, build_txs):
+        """Envia as transações com uma faixa de nonces consecutivos. Retorna, por item, o hash ou a exceção"""
+        first = await self.allocate(len(build_txs))
+        results = await asyncio.gather(
+            *(self.send_with_nonce(build_tx, first + i) for i, build_tx in enumerate(build_txs)),
+            return_exceptions=True,
+        )
+        if any(isinstance(result, Exception) for result in results):
+            await self.invalidate()
+        return results
+
+
+# Acompanha os recibos das transações enviadas, em lotes de `eth_getTransactionReceipt`
+# A cada rodada também lê o número do último bloco, que renova o cache de leituras
+class AsyncReceiptTracker:
+    def __init__(self, provider, read_cache, poll_interval=1.0, max_done=100000, max_age=RECEIPT_MAX_AGE):
+        # Provider próprio: durante um lote o web3 marca o provider como "em lote", o que
+        # quebraria as chamadas feitas ao mesmo tempo pelas requisições
+        self.provider = provider
+        self.read_cache = read_cache
+        self.poll_interval = poll_interval
+        self.max_done = max_done
+        self.max_age = max_age
+        self.pending = {}  # tx_hash -> (enviada em, callback, probes do lote)
+        self.done = OrderedDict()  # tx_hash -> status final, as mais antigas são descartadas
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def track(self, tx_hash, on_receipt=None, probes=None):
+        """Registra `tx_hash`. `await on_receipt(status)` é chamada quando for minerada.
+        `probes` (de `probe_keys`): os itens de uma transação de lote, para o status dizer quais foram pulados"""
+        self.pending[tx_hash] = (time(), on_receipt, probes)
+
+    def status(self, tx_hash):
+        if tx_hash in self.done:
+            return self.done[tx_hash]
+        if tx_hash in self.pending:
+            return {"txHash": tx_hash, "status": "pending", "sentAt": self.pending[tx_hash][0]}
+        return None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self.poll_block()
+            # Lotes de até RPC_BATCH_SIZE recibos: um lote recusado não trava os outros
+            for chunk in chunked(list(self.pending)):
+                await self.poll_receipts(chunk)
+            await self.expire()
+
+    async def poll_block(self):
+        try:
+            response = await self.provider.make_request('eth_blockNumber', [])
+        except Exception as e:
+            print(f"--> Falha ao buscar o último bloco: {e!r}")
+            return
+        if 'result' in response:
+            self.read_cache.set_block(int(response['result'], 16))
+        else:
+            print(f"--> Falha ao buscar o último bloco: {response.get('error')}")
+
+    async def poll_receipts(self, tx_hashes):
+        try:
+            responses = await self.provider.make_batch_request(
+                [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes]
+            )
+        except Exception as e:
+            print(f"--> Falha ao buscar recibos: {e!r}")
+            return
+        if isinstance(responses, dict):
+            # O nó recusou o lote inteiro
+            print(f"--> Falha ao buscar recibos: {responses.get('error')}")
+            return
+
+        for tx_hash, response in zip(tx_hashes, responses):
+            receipt = response.get('result')
+            if receipt:
+                probes = self.pending[tx_hash][2]
+                status = receipt_status(tx_hash, receipt, probes)
+                if status["status"] == "failed":
+                    print(f"--> A transação {tx_hash} falhou.")
+                elif status.get("skipped"):
+                    print(f"--> A transação {tx_hash} pulou {len(status['skipped'])} de {len(probes)} probes.")
+                await self.finish(tx_hash, status)
+
+    async def expire(self):
+        oldest = time() - self.max_age
+        expired = [(tx_hash, sent_at) for tx_hash, (sent_at, _, _) in self.pending.items() if sent_at < oldest]
+        for tx_hash, sent_at in expired:
+            print(f"--> A transação {tx_hash} ficou sem recibo por {self.max_age:.0f}s e deixou de ser acompanhada.")
+            await self.finish(tx_hash, dropped_status(tx_hash, sent_at))
+
+    async def finish(self, tx_hash, status):
+        _, on_receipt, _ = self.pending.pop(tx_hash)
+        self.done[tx_hash] = status
+        while len(self.done) > self.max_done:
+            self.done.popitem(last=False)
+
+        # Só transações mineradas têm recibo para tratar
+        if on_receipt is not None and status["status"] != "dropped":
+            try:
+                await on_receipt(status)
+            except Exception as e:
+                print(f"--> Erro ao tratar o recibo de {tx_hash}: {e!r}")
+
+
+# Conexão com o nó e estado da API, criados na inicialização do servidor
+class PoTApi:
+    async def connect(self):
+        # Aguarda o nó subir, como `main.py`
+        await asyncio.sleep(5)
+
+        self.session = ClientSession(
+            connector=TCPConnector(limit=RPC_POOL_SIZE),
+            timeout=ClientTimeout(total=RPC_TIMEOUT),
+        )
+        provider = AsyncHTTPProvider(BLOCKCHAIN_HOST)
+        await provider.cache_async_session(self.session)
+        self.w3 = AsyncWeb3(provider)
+
+        if not await self.w3.is_connected():
+            raise RuntimeError("Não foi possível conectar-se à blockchain")
+        print("Conectado à blockchain com sucesso!")
+
+        contract_name, contract_address, abi = load_contract_data()
+        print(f"Endereço do contrato implantado ({contract_name}): {contract_address}")
+        print('Endereço do nó de controle: ' + controller_address)
+        print('Endereço do nó de saída: ' + egress_address)
+
+        self.contract = self.w3.eth.contract(address=contract_address, abi=abi)
+        self.tx_templates = build_tx_templates(abi, contract_address, await self.w3.eth.chain_id)
+        self.call_templates = build_call_templates(abi, contract_address)
+        self.nonce_managers = {
+            address: AsyncNonceManager(self.w3, address, private_key) for address, private_key in private_keys.items()
+        }
+        # Leituras do contrato, válidas até o próximo bloco
+        self.read_cache = ReadCache()
+        # Provider só para lotes JSON-RPC (recibos, histórico), que não podem dividir o provider com `self.w3`
+        self.batch_provider = AsyncHTTPProvider(BLOCKCHAIN_HOST)
+        await self.batch_provider.cache_async_session(self.session)
+        self.receipts = AsyncReceiptTracker(self.batch_provider, self.read_cache, RECEIPT_POLL_INTERVAL)
+        self.receipts.start()
+
+    async def close(self):
+        await self.receipts.stop()
+        await self.session.close()
+
+    async def transact(self, function_name, *args, on_receipt=None):
+        template = self.tx_templates[function_name]
+        # O primeiro argumento é o flowId (exceto em `echo`, que não afeta leituras)
+        if function_name != 'echo':
+            self.read_cache.invalidate_flow(args[0])
+        tx_hash = self.w3.to_hex(await self.nonce_managers[template.from_address].send(template.builder(*args)))
+        self.receipts.track(tx_hash, on_receipt)
+        return tx_hash
+
+    async def send_batch(self, function_name, items, arg_keys):
+        template = self.tx_templates[function_name]
+        for flow_id in {item['flowId'] for item in items}:
+            self.read_cache.invalidate_flow(flow_id)
+        # Poucas transações da função de lote, com `PROBE_BATCH_SIZE` probes cada
+        batches = probe_batches(items, arg_keys)
+        build_txs = [template.builder(*args, gas=gas) for args, gas, _ in batches]
+
+        results = []
+        probes = probe_keys(items)
+        sent = await self.nonce_managers[template.from_address].send_many(build_txs)
+        for result, (_, _, n_items) in zip(sent, batches):
+            if isinstance(result, Web3RPCError):
+                error = {"error": rpc_error_message(result)}
+                results.extend(error for _ in range(n_items))
+            elif isinstance(result, Exception):
+                error = {"error": repr(result)}
+                results.extend(error for _ in range(n_items))
+            else:
+                tx_hash = self.w3.to_hex(result)
+                # Posição de cada item na transação: a de `skipped` em `/tx/<hash>`
+                self.receipts.track(tx_hash, probes=probes[len(results):len(results) + n_items])
+                results.extend({"txHash": tx_hash, "index": index} for index in range(n_items))
+        return results
+
+    async def print_echo(self, status):
+        # Captura os logs do evento Echo
+        logs = await self.contract.events.Echo.get_logs(from_block=status['blockNumber'], to_block=status['blockNumber'])
+
+        # Extrai a mensagem do evento
+        for log in logs:
+            print(f"Mensagem do evento Echo: {log['args']['message']}")
+
+    async def read(self, function_name, *args):
+        """Chama uma função de leitura pelo cache. Retorna o status HTTP e o resultado (ou a mensagem de erro)"""
+        found, value = self.read_cache.lookup(function_name, args)
+        if found:
+            return HTTPStatus.OK, value
+
+        # No bloco que o cache conhece, para a resposta corresponder à chave
+        block = value[0][2]
+        # Os argumentos seguem o formato JSON da API; o contrato recebe os tipos do ABI
+        call_args = abi_args(self.call_templates[function_name].arg_types, args)
+        try:
+            result = await getattr(self.contract.functions, function_name)(*call_args).call(
+                block_identifier=block if block is not None else 'latest'
+            )
+        except Web3RPCError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, rpc_error_message(e)
+
+        self.read_cache.store(value, result)
+        return HTTPStatus.OK, result
+
+    async def read_history(self, flowId, offset=0, limit=None):
+        """O histórico inteiro (ou uma página dele) e a rota atual: lotes de até RPC_BATCH_SIZE `eth_call`"""
+        found, value = self.read_cache.lookup('getFlowComplianceHistory', (flowId, offset, limit))
+        if found:
+            # Pode ter sido guardada para outra grafia do mesmo flowId
+            return HTTPStatus.OK, {**value, "flowId": flowId}
+
+        try:
+            # Todas as chamadas no mesmo bloco: o do cache, ou o último quando o cache não tem um
+            block = value[0][2]
+            if block is None:
+                block = await self.w3.eth.block_number
+
+            size_call = self.call_templates['getFlowSizeRoutesHistory']
+            size, = size_call.result(await self.batch_provider.make_request(*size_call.request(flowId, block=block)))
+            requests = history_requests(self.call_templates, flowId, history_page(size, offset, limit), block)
+            current, history = history_result(
+                self.call_templates, [await self.batch_provider.make_batch_request(batch) for batch in chunked(requests)]
+            )
+        except ValueError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, str(e)
+        except Web3RPCError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, rpc_error_message(e)
+
+        result = compliance_history_response(flowId, size, offset, current, history)
+        self.read_cache.store(value, result)
+        return HTTPStatus.OK, result
+
+
+pot = PoTApi()
+
+
+# --- Rotas --- #
+
+async def get_json(request, required_keys):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not all(key in data for key in required_keys):
+        return None
+    return data
+
+
+def invalid_data():
+    return JSONResponse({"error": "Invalid Data"}, HTTPStatus.BAD_REQUEST)
+
+
+async def home(request):
+    return JSONResponse("Working")
+
+
+async def hello(request):
+    # A mensagem do evento é impressa quando a transação for minerada
+    return JSONResponse(await pot.transact('echo', "Hello", on_receipt=pot.print_echo))
+
+
+async def deployFlowContract(request):
+    data = await get_json(request, ('flowId', 'routeId', 'edgeAddr'))
+    if data is None or flow_request_error(data, 'routeId', 'edgeAddr') is not None:
+        return invalid_data()
+
+    tx_hash = await pot.transact('newFlow', data['flowId'], data['edgeAddr'], data['routeId'])
+    return JSONResponse(tx_hash, HTTPStatus.CREATED)
+
+
+async def setRefSig(request):
+    data = await get_json(request, PROBE_KEYS)
+    if data is None or probe_error(data) is not None:
+        return invalid_data()
+
+    return JSONResponse(await pot.transact('setFlowProbeHash', data['flowId'], data['timestamp'], data['lightMultSig']))
+
+
+async def logProbe(request):
+    data = await get_json(request, PROBE_KEYS)
+    if data is None or probe_error(data) is not None:
+        return invalid_data()
+
+    return JSONResponse(await pot.transact('logFlowProbeHash', data['flowId'], data['timestamp'], data['lightMultSig']))
+
+
+async def batch_route(request, function_name):
+    try:
+        items, errors = parse_batch((await request.body()).decode('utf-8'))
+    except ValueError as e:
+        return JSONResponse({"error": f"Invalid JSON: {e}"}, HTTPStatus.BAD_REQUEST)
+
+    # Só os itens válidos são enviados; os inválidos recebem o próprio erro na sua posição
+    valid = [item for i, item in enumerate(items) if i not in errors]
+    if not valid:
+        return JSONResponse(with_item_errors(errors, []))
+
+    results = await pot.send_batch(function_name, valid, ('flowId', 'timestamp', 'lightMultSig'))
+    return JSONResponse(with_item_errors(errors, results))
+
+
+async def setRefSigs(request):
+    return await batch_route(request, 'setFlowProbeHashes')
+
+
+async def logProbes(request):
+    return await batch_route(request, 'logFlowProbeHashes')
+
+
+async def setRouteId(request):
+    data = await get_json(request, ('flowId', 'newRouteId', 'newEdgeAddr'))
+    if data is None or flow_request_error(data, 'newRouteId', 'newEdgeAddr') is not None:
+        return invalid_data()
+
+    tx_hash = await pot.transact('setRouteId', data['flowId'], data['newRouteId'], data['newEdgeAddr'])
+    return JSONResponse(tx_hash, HTTPStatus.CREATED)
+
+
+async def getFlowCompliance(request):
+    status, result = await pot.read('getFlowCompliance', request.path_params['flowId'])
+
+    response = compliance_response(*result) if status == HTTPStatus.OK else result
+    return JSONResponse(response, status)
+
+
+async def getFlowSizeRoutesHistory(request):
+    status, result = await pot.read('getFlowSizeRoutesHistory', request.path_params['flowId'])
+
+    response = [result] if status == HTTPStatus.OK else result
+    return JSONResponse(response, status)
+
+
+async def getFlowComplianceOfRouteHistoryIndex(request):
+    flowId, index = request.path_params['flowId'], int(request.path_params['index'])
+    status, result = await pot.read('getFlowComplianceOfRouteHistoryIndex', flowId, index)
+
+    response = compliance_response(*result) if status == HTTPStatus.OK else result
+    return JSONResponse(response, status)
+
+
+async def getFlowComplianceHistory(request):
+    # Paginação opcional: `?offset=&limit=`
+    try:
+        offset = int(request.query_params.get('offset', 0))
+        limit = int(request.query_params['limit']) if 'limit' in request.query_params else None
+    except ValueError:
+        return invalid_data()
+    if offset < 0 or (limit is not None and limit < 0):
+        return invalid_data()
+
+    status, result = await pot.read_history(request.path_params['flowId'], offset, limit)
+    return JSONResponse(result, status)
+
+
+async def cacheMetrics(request):
+    return JSONResponse(pot.read_cache.stats())
+
+
+async def txStatus(request):
+    tx_hash = request.path_params['tx_hash']
+    status = pot.receipts.status(tx_hash.lower())
+
+    if status is None:
+        return JSONResponse({"txHash": tx_hash, "status": "unknown"}, HTTPStatus.NOT_FOUND)
+
+    return JSONResponse(status)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await pot.connect()
+    yield
+    await pot.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/', home),
+        Route('/hello', hello),
+        Route('/deployFlowContract', deployFlowContract, methods=['POST']),
+        Route('/setRefSig', setRefSig, methods=['POST']),
+        Route('/logProbe', logProbe, methods=['POST']),
+        Route('/setRefSigs', setRefSigs, methods=['POST']),
+        Route('/logProbes', logProbes, methods=['POST']),
+        Route('/setRouteId', setRouteId, methods=['POST']),
+        Route('/getFlowCompliance/{flowId}', getFlowCompliance),
+        Route('/getFlowSizeRoutesHistory/{flowId}', getFlowSizeRoutesHistory),
+        Route('/getFlowComplianceOfRouteHistoryIndex/{flowId}/{index}', getFlowComplianceOfRouteHistoryIndex),
+        Route('/getFlowComplianceHistory/{flowId}', getFlowComplianceHistory),
+        Route('/tx/{tx_hash}', txStatus),
+        Route('/cacheMetrics', cacheMetrics),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Um worker só: com mais de um, os alocadores de nonce de cada processo disputariam as mesmas contas
+    uvicorn.run("asgi:app", host='0.0.0.0', port=5000, workers=1)
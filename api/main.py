@@ -1,24 +1,65 @@
 from flask import Flask, jsonify, request
 from flask_restful import Api
+from werkzeug.serving import WSGIRequestHandler
 from web3 import Web3
 from web3.exceptions import Web3RPCError
-import json
 from http import HTTPStatus
 from dotenv import load_dotenv
 import os
-from time import sleep
+import threading
+from collections import OrderedDict
+from time import sleep, time
 
 app = Flask(__name__)
 api = Api(app)
 
 load_dotenv()
 
-CONTRACT_FILE_PATH = "/data/contract-data.json"
+from shared import (
+    BLOCKCHAIN_HOST,
+    PROBE_KEYS,
+    RECEIPT_MAX_AGE,
+    RECEIPT_POLL_INTERVAL,
+    RPC_BATCH_SIZE,
+    ReadCache,
+    abi_args,
+    batch_results,
+    build_call_templates,
+    build_tx_templates,
+    chunked,
+    compliance_history_response,
+    compliance_response,
+    controller_address,
+    deployer_address,
+    dropped_status,
+    flow_request_error,
+    egress_address,
+    history_page,
+    history_requests,
+    history_result,
+    is_known_tx_error,
+    is_nonce_error,
+    load_contract_data,
+    parse_batch,
+    private_keys,
+    probe_batches,
+    probe_error,
+    probe_keys,
+    receipt_status,
+    with_item_errors,
+)
+from rpc_batching import CoalescingHTTPProvider
+
+# Chamadas concorrentes ao nó que chegam na mesma janela vão num único lote JSON-RPC (0 desliga)
+RPC_BATCH_WINDOW_MS = float(os.getenv('RPC_BATCH_WINDOW_MS', '2'))
 
 # Conectar-se ao Ganache (assumindo que o Ganache está rodando na porta padrão 8545)
 # w3 = Web3(Web3.HTTPProvider('http://200.137.0.26:21031')) iliada
 sleep(5)
-w3 = Web3(Web3.HTTPProvider('http://besu:8545'))
+if RPC_BATCH_WINDOW_MS > 0:
+    w3 = Web3(CoalescingHTTPProvider(BLOCKCHAIN_HOST, window=RPC_BATCH_WINDOW_MS / 1000, max_batch=RPC_BATCH_SIZE))
+else:
+    w3 = Web3(Web3.HTTPProvider(BLOCKCHAIN_HOST))
 
 # Verificar a conexão
 if w3.is_connected():
@@ -28,171 +69,295 @@ else:
     exit()
 
 # Endereço da conta que fez a implantação
-deployer_address = "0x627306090abaB3A6e1400e9345bC60c78a8BEf57"  # Conta padrão de testes
-deployer_private_key = "0xc87509a1c067bbde78beb793e6fa76530b6382a4c0241e5e4a9ec0a0f44dc0d3"
 print("Endereço da conta que realizou deploy: " + deployer_address)
 
+# Nome (PoTFactory ou PoTLedger), endereço do contrato e abi
+contract_name, contract_address, abi = load_contract_data()
 
-with open(CONTRACT_FILE_PATH, "r") as f:
-    data = json.load(f)
-
-# Endereço do contrato
-contract_address = data["contract_address"]
-# Carregando a abi
-abi = data["abi"]
-
-print(f"Endereço do contrato implantado: {contract_address}")
+print(f"Endereço do contrato implantado ({contract_name}): {contract_address}")
 
 # Obter instância do contrato
 contract = w3.eth.contract(address=contract_address, abi=abi)
 
-## Contas padrão de testes do Besu ##
-# Endereço da controller
-controller_address = "0x627306090abaB3A6e1400e9345bC60c78a8BEf57"
-controller_private_key = "0xc87509a1c067bbde78beb793e6fa76530b6382a4c0241e5e4a9ec0a0f44dc0d3"
+## Contas padrão de testes do Besu (em `shared.py`) ##
 print('Endereço do nó de controle: ' + controller_address)
-
-# Endereço do nó de saída
-egress_address = "0xf17f52151EbEF6C7334FAD080c5704D77216b732"
-egress_private_key = "0xae6ae8e5ccbfb04590405997ee2d52d2b330726137b875053c36d94e974d162f"
 print('Endereço do nó de saída: ' + egress_address)
 
 # Endereço do auditor
 # auditor_address = w3.eth.accounts[3]
 # print('Endereço para auditor: ' + auditor_address)
 
+# Alocador de nonces de uma conta: busca o nonce uma vez e incrementa localmente
+class NonceManager:
+    def __init__(self, address, private_key):
+        self.address = address
+        self.private_key = private_key
+        self.lock = threading.Lock()
+        self.next_nonce = None
+
+    def sync(self):
+        self.next_nonce = w3.eth.get_transaction_count(self.address, 'pending')
+
+    def _send(self, build_tx):
+        # Chamado com a trava: o nonce só avança se o nó aceitar a transação
+        if self.next_nonce is None:
+            self.sync()
+
+        for retry in (False, True):
+            signed_tx = w3.eth.account.sign_transaction(build_tx(self.next_nonce), self.private_key)
+            try:
+                tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except Web3RPCError as e:
+                message = e.rpc_response['error']['message']
+                if is_known_tx_error(message):
+                    # Já está no nó: o hash é o da transação assinada e o nonce foi usado
+                    self.next_nonce += 1
+                    return signed_tx.hash
+                if retry or not is_nonce_error(message):
+                    raise
+                print(f"--> Nonce {self.next_nonce} de {self.address} fora de sincronia: {message}")
+                self.sync()
+                continue
+
+            self.next_nonce += 1
+            return tx_hash
+
+    def send(self, build_tx):
+        """Assina e envia `build_tx(nonce)`. Retorna o hash da transação"""
+        with self.lock:
+            return self._send(build_tx)
+
+    def send_many(self, build_txs):
+        """Envia as transações com nonces consecutivos. Retorna os hashes e o erro que interrompeu o lote (ou None)"""
+        tx_hashes = []
+        with self.lock:
+            for build_tx in build_txs:
+                try:
+                    tx_hashes.append(self._send(build_tx))
+                except Web3RPCError as e:
+                    return tx_hashes, e.rpc_response['error']['message']
+                except Exception as e:
+                    # Não se sabe se o nó recebeu a transação: o nonce é relido no próximo envio
+                    self.next_nonce = None
+                    return tx_hashes, repr(e)
+        return tx_hashes, None
+
+nonce_managers = {address: NonceManager(address, private_key) for address, private_key in private_keys.items()}
+
+# Leituras do contrato, válidas até o próximo bloco
+read_cache = ReadCache()
+
+# Provider só para lotes JSON-RPC: durante um lote o web3 marca o provider como "em lote", o que
+# quebraria as chamadas feitas ao mesmo tempo pelas requisições através de `w3`
+batch_provider = Web3.HTTPProvider(BLOCKCHAIN_HOST)
+
+# Acompanha os recibos das transações enviadas em segundo plano, em lotes de `eth_getTransactionReceipt`
+# A cada rodada também lê o número do último bloco, que renova o cache de leituras
+class ReceiptTracker:
+    def __init__(self, poll_interval=1.0, max_done=100000, max_age=RECEIPT_MAX_AGE):
+        self.provider = batch_provider
+        self.poll_interval = poll_interval
+        self.max_done = max_done
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.pending = {}  # tx_hash -> (enviada em, callback, probes do lote)
+        self.done = OrderedDict()  # tx_hash -> status final, as mais antigas são descartadas
+        self.thread = threading.Thread(target=self.run, name="receipts", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def track(self, tx_hash, on_receipt=None, probes=None):
+        """Registra `tx_hash`. `on_receipt(status)` é chamada pela thread do tracker quando for minerada.
+        `probes` (de `probe_keys`): os itens de uma transação de lote, para o status dizer quais foram pulados"""
+        with self.lock:
+            self.pending[tx_hash] = (time(), on_receipt, probes)
+
+    def status(self, tx_hash):
+        with self.lock:
+            if tx_hash in self.done:
+                return self.done[tx_hash]
+            if tx_hash in self.pending:
+                return {"txHash": tx_hash, "status": "pending", "sentAt": self.pending[tx_hash][0]}
+        return None
+
+    def run(self):
+        while True:
+            sleep(self.poll_interval)
+            self.poll_block()
+            with self.lock:
+                tx_hashes = list(self.pending)
+            # Lotes de até RPC_BATCH_SIZE recibos: um lote recusado não trava os outros
+            for chunk in chunked(tx_hashes):
+                self.poll_receipts(chunk)
+            self.expire()
+
+    def poll_block(self):
+        try:
+            response = self.provider.make_request('eth_blockNumber', [])
+        except Exception as e:
+            print(f"--> Falha ao buscar o último bloco: {e!r}")
+            return
+        if 'result' in response:
+            read_cache.set_block(int(response['result'], 16))
+        else:
+            print(f"--> Falha ao buscar o último bloco: {response.get('error')}")
+
+    def poll_receipts(self, tx_hashes):
+        try:
+            responses = self.provider.make_batch_request(
+                [('eth_getTransactionReceipt', [tx_hash]) for tx_hash in tx_hashes]
+            )
+        except Exception as e:
+            print(f"--> Falha ao buscar recibos: {e!r}")
+            return
+        if isinstance(responses, dict):
+            # O nó recusou o lote inteiro
+            print(f"--> Falha ao buscar recibos: {responses.get('error')}")
+            return
+
+        for tx_hash, response in zip(tx_hashes, responses):
+            receipt = response.get('result')
+            if receipt:
+                with self.lock:
+                    probes = self.pending[tx_hash][2]
+                status = receipt_status(tx_hash, receipt, probes)
+                if status["status"] == "failed":
+                    print(f"--> A transação {tx_hash} falhou.")
+                elif status.get("skipped"):
+                    print(f"--> A transação {tx_hash} pulou {len(status['skipped'])} de {len(probes)} probes.")
+                self.finish(tx_hash, status)
+
+    def expire(self):
+        oldest = time() - self.max_age
+        with self.lock:
+            expired = [(tx_hash, sent_at) for tx_hash, (sent_at, _, _) in self.pending.items() if sent_at < oldest]
+        for tx_hash, sent_at in expired:
+            print(f"--> A transação {tx_hash} ficou sem recibo por {self.max_age:.0f}s e deixou de ser acompanhada.")
+            self.finish(tx_hash, dropped_status(tx_hash, sent_at))
+
+    def finish(self, tx_hash, status):
+        with self.lock:
+            _, on_receipt, _ = self.pending.pop(tx_hash)
+            self.done[tx_hash] = status
+            while len(self.done) > self.max_done:
+                self.done.popitem(last=False)
+
+        # Só transações mineradas têm recibo para tratar
+        if on_receipt is not None and status["status"] != "dropped":
+            try:
+                on_receipt(status)
+            except Exception as e:
+                print(f"--> Erro ao tratar o recibo de {tx_hash}: {e!r}")
+
+receipts = ReceiptTracker(RECEIPT_POLL_INTERVAL)
+receipts.start()
+
+# O chain id não muda: lido uma única vez
+chain_id = w3.eth.chain_id
+
+tx_templates = build_tx_templates(abi, contract_address, chain_id)
+call_templates = build_call_templates(abi, contract_address)
+
+# Assina e envia com o próximo nonce da conta: o único RPC é o `eth_sendRawTransaction`
+def transact(function_name, *args, on_receipt=None):
+    template = tx_templates[function_name]
+    # O primeiro argumento é o flowId (exceto em `echo`, que não afeta leituras)
+    if function_name != 'echo':
+        read_cache.invalidate_flow(args[0])
+    tx_hash = w3.to_hex(nonce_managers[template.from_address].send(template.builder(*args)))
+    receipts.track(tx_hash, on_receipt)
+    return tx_hash
+
 # Função para chamar `echo` e emitir o evento
 def call_echo(message):
-    # Prepara a transação para chamar a função `echo`
-    transaction = contract.functions.echo(message).build_transaction({
-        'from': controller_address,
-        'gas': 2000000,
-        'gasPrice': w3.to_wei('20', 'gwei'),
-        'nonce': w3.eth.get_transaction_count(controller_address),
-    })
-
-    # Assinar transacao
-    signed_tx = w3.eth.account.sign_transaction(transaction, controller_private_key)
-
-    # Envia a transação
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-
-    # Espera a transação ser minerada
-    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    # A mensagem do evento é impressa quando a transação for minerada
+    return transact('echo', message, on_receipt=print_echo)
 
+def print_echo(status):
     # Captura os logs do evento Echo
-    logs = contract.events.Echo.create_filter(from_block=tx_receipt['blockNumber'], to_block=tx_receipt['blockNumber']).get_all_entries()
+    logs = contract.events.Echo.create_filter(from_block=status['blockNumber'], to_block=status['blockNumber']).get_all_entries()
 
     # Extrai a mensagem do evento
     for log in logs:
         print(f"Mensagem do evento Echo: {log['args']['message']}")
 
-    return w3.to_hex(tx_hash)
-
 # Função para chamar `newFlow`
 def call_newFlow(newFlowContract):
-
-    # Prepara a transação
-    nonce = w3.eth.get_transaction_count(controller_address)
-
-    tx = contract.functions.newFlow(
+    return transact('newFlow', 
         newFlowContract['flowId'],
         newFlowContract['edgeAddr'],
         newFlowContract['routeId']
-    ).build_transaction({
-        'from': controller_address,
-        'gas': 2000000,
-        'gasPrice': w3.to_wei('20', 'gwei'),
-        'nonce': nonce,
-        'chainId': w3.eth.chain_id  
-    })
-
-    # Assina a transação
-    signed_tx = w3.eth.account.sign_transaction(tx, controller_private_key)
-
-    # Envia a transação assinada
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-    return w3.to_hex(tx_hash)
-
+    )
 
 # Função para chamar `setFlowProbeHash` e emitir o evento
 def call_setFlowProbeHash(newRefSig):
-    
-    tx = contract.functions.setFlowProbeHash(
+    return transact('setFlowProbeHash', 
         newRefSig['flowId'],
         newRefSig['timestamp'],
         newRefSig['lightMultSig']
-    ).build_transaction({
-        'from': controller_address,
-        'gas': 2000000,
-        'gasPrice': w3.to_wei('30', 'gwei'),
-        'nonce': w3.eth.get_transaction_count(controller_address, 'pending'),
-        'chainId': w3.eth.chain_id  
-    })
-
-    # Assina a transação
-    signed_tx = w3.eth.account.sign_transaction(tx, controller_private_key)
-
-    # Envia a transação assinada
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-    return w3.to_hex(tx_hash)
+    )
 
 # Função para chamar `logProbe` e emitir o evento
 def call_logFlowProbeHash(newlogProbe):
-
-    # Prepara a transação para chamar a função `logProbe
-    tx = contract.functions.logFlowProbeHash(
+    return transact('logFlowProbeHash', 
         newlogProbe['flowId'], 
         newlogProbe['timestamp'], 
         newlogProbe['lightMultSig']
-    ).build_transaction({
-        'from': egress_address,
-        'gas': 2000000,
-        'gasPrice': w3.to_wei('20', 'gwei'),
-        'nonce': w3.eth.get_transaction_count(egress_address, 'pending'),
-        'chainId': w3.eth.chain_id  
-    })
+    )
 
-    signed_tx = w3.eth.account.sign_transaction(tx, egress_private_key)
+# Envia um lote de probes em poucas transações da função de lote (`PROBE_BATCH_SIZE` probes cada), com nonces consecutivos
+def send_batch(function_name, items, arg_keys):
+    template = tx_templates[function_name]
+    for flow_id in {item['flowId'] for item in items}:
+        read_cache.invalidate_flow(flow_id)
+    batches = probe_batches(items, arg_keys)
+    build_txs = [template.builder(*args, gas=gas) for args, gas, _ in batches]
 
-    # Envia a transação assinada
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+    tx_hashes, error = nonce_managers[template.from_address].send_many(build_txs)
 
-    return w3.to_hex(tx_hash)
+    tx_hashes = [w3.to_hex(tx_hash) for tx_hash in tx_hashes]
+    probes = probe_keys(items)
+    start = 0
+    for tx_hash, (_, _, n_items) in zip(tx_hashes, batches):
+        receipts.track(tx_hash, probes=probes[start:start + n_items])
+        start += n_items
+    return batch_results(tx_hashes, error, [n_items for _, _, n_items in batches])
 
-def call_setRouteId(newRouteAndEdge):
+def call_setFlowProbeHashes(newRefSigs):
+    return send_batch('setFlowProbeHashes', newRefSigs, ('flowId', 'timestamp', 'lightMultSig'))
 
-    # Prepara a transação
-    nonce = w3.eth.get_transaction_count(controller_address)
+def call_logFlowProbeHashes(newlogProbes):
+    return send_batch('logFlowProbeHashes', newlogProbes, ('flowId', 'timestamp', 'lightMultSig'))
 
-    tx = contract.functions.setRouteId(
+def call_setRouteId(newRouteAndEdge):
+    return transact('setRouteId', 
         newRouteAndEdge['flowId'],
         newRouteAndEdge['newRouteId'],
         newRouteAndEdge['newEdgeAddr']
-    ).build_transaction({
-        'from': controller_address,
-        'gas': 2000000,
-        'gasPrice': w3.to_wei('20', 'gwei'),
-        'nonce': nonce,
-        'chainId': w3.eth.chain_id  
-    })
-
-    # Assina a transação
-    signed_tx = w3.eth.account.sign_transaction(tx, controller_private_key)
-
-    # Envia a transação assinada
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-
-    return w3.to_hex(tx_hash)
+    )
+
+# Chama uma função de leitura pelo cache. No bloco que o cache conhece, para a resposta corresponder à chave
+def cached_call(function_name, *args):
+    found, value = read_cache.lookup(function_name, args)
+    if found:
+        return value
+
+    block = value[0][2]
+    # Os argumentos seguem o formato JSON da API; o contrato recebe os tipos do ABI
+    call_args = abi_args(call_templates[function_name].arg_types, args)
+    result = getattr(contract.functions, function_name)(*call_args).call(
+        block_identifier=block if block is not None else 'latest'
+    )
+    read_cache.store(value, result)
+    return result
 
 def call_getFlowCompliance(flowId):
     # Chama a função `getFlowCompliance`
 
     result = {}
     try:
-        success, fail, nil, routeId = contract.functions.getFlowCompliance(flowId).call()   
+        success, fail, nil, routeId = cached_call('getFlowCompliance', flowId)   
         status = HTTPStatus.OK
 
         result["success"] = success
@@ -211,7 +376,7 @@ def call_getFlowSizeRoutesHistory(flowId):
 
     result = 0
     try:
-        result = contract.functions.getFlowSizeRoutesHistory(flowId).call()
+        result = cached_call('getFlowSizeRoutesHistory', flowId)
         status = HTTPStatus.OK
 
     except Web3RPCError as e:
@@ -225,7 +390,7 @@ def call_getFlowComplianceOfRouteHistoryIndex(flowId, index):
 
     result = {}
     try:
-        success, fail, nil, routeId = contract.functions.getFlowComplianceOfRouteHistoryIndex(flowId, index).call()   
+        success, fail, nil, routeId = cached_call('getFlowComplianceOfRouteHistoryIndex', flowId, index)   
         status = HTTPStatus.OK
 
         result["success"] = success
@@ -239,19 +404,31 @@ def call_getFlowComplianceOfRouteHistoryIndex(flowId, index):
     
     return status, result
 
-def verify_tx_status(tx_hash):
-    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    if tx_receipt:
-        if tx_receipt['status'] == 1:
-            print("--> A transação foi executada com sucesso.")
-            return HTTPStatus.OK
-        else:
-            print("--> A transação falhou.")
-            return HTTPStatus.INTERNAL_SERVER_ERROR
-    else:
-        print("--> A transação ainda está pendente.")
-        return HTTPStatus.ACCEPTED
+def call_getFlowComplianceHistory(flowId, offset=0, limit=None):
+    # O histórico inteiro (ou uma página dele) e a rota atual: lotes de até RPC_BATCH_SIZE `eth_call`
+    found, value = read_cache.lookup('getFlowComplianceHistory', (flowId, offset, limit))
+    if found:
+        # Pode ter sido guardada para outra grafia do mesmo flowId
+        return HTTPStatus.OK, {**value, "flowId": flowId}
+
+    try:
+        # Todas as chamadas no mesmo bloco: o do cache, ou o último quando o cache não tem um
+        block = value[0][2]
+        if block is None:
+            block = w3.eth.block_number
+
+        size_call = call_templates['getFlowSizeRoutesHistory']
+        size, = size_call.result(batch_provider.make_request(*size_call.request(flowId, block=block)))
+        requests = history_requests(call_templates, flowId, history_page(size, offset, limit), block)
+        current, history = history_result(call_templates, [batch_provider.make_batch_request(batch) for batch in chunked(requests)])
+    except ValueError as e:
+        return HTTPStatus.INTERNAL_SERVER_ERROR, str(e)
+    except Web3RPCError as e:
+        return HTTPStatus.INTERNAL_SERVER_ERROR, e.rpc_response['error']['message']
 
+    result = compliance_history_response(flowId, size, offset, current, history)
+    read_cache.store(value, result)
+    return HTTPStatus.OK, result
 
 @app.route('/')
 def home():
@@ -266,7 +443,7 @@ def hello():
 def deployFlowContract():
     data = request.get_json()
 
-    if 'flowId' not in data or 'routeId' not in data or 'edgeAddr' not in data:
+    if flow_request_error(data, 'routeId', 'edgeAddr') is not None:
         return jsonify({"error": "Invalid Data"}), HTTPStatus.BAD_REQUEST
     
     newFlowContract = {
@@ -277,16 +454,14 @@ def deployFlowContract():
 
     tx_hash = call_newFlow(newFlowContract)
 
-    verify_tx_status(tx_hash)
-
+    # O status fica em `/tx/<hash>`, a requisição não espera a mineração
     return jsonify(tx_hash), HTTPStatus.CREATED
 
 @app.route('/setRefSig', methods=['POST'])
 def setRefSig():
     data = request.get_json()
 
-    required_keys = ['flowId', 'routeId', 'timestamp', 'lightMultSig']
-    if not all(key in data for key in required_keys):   
+    if probe_error(data) is not None:
         return jsonify({"error": "Invalid Data"}), HTTPStatus.BAD_REQUEST
     
     print(data)
@@ -320,8 +495,7 @@ def setRefSig():
 def logProbe():
     data = request.get_json()
 
-    required_keys = ['flowId', 'routeId', 'timestamp', 'lightMultSig']
-    if not all(key in data for key in required_keys):   
+    if probe_error(data) is not None:
         return jsonify({"error": "Invalid Data"}), HTTPStatus.BAD_REQUEST
     
     print(data)
@@ -352,11 +526,33 @@ def logProbe():
     return jsonify(message)#, status_http
 
 
+def batch_route(call_fn):
+    try:
+        items, errors = parse_batch(request.get_data(as_text=True))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid JSON: {e}"}), HTTPStatus.BAD_REQUEST
+
+    # Só os itens válidos são enviados; os inválidos recebem o próprio erro na sua posição
+    valid = [{key: item[key] for key in PROBE_KEYS} for i, item in enumerate(items) if i not in errors]
+    if not valid:
+        return jsonify(with_item_errors(errors, []))
+
+    print(f"Lote de {len(valid)} itens" + (f" ({len(errors)} inválidos)" if errors else ""))
+    return jsonify(with_item_errors(errors, call_fn(valid)))
+
+@app.route('/setRefSigs', methods=['POST'])
+def setRefSigs():
+    return batch_route(call_setFlowProbeHashes)
+
+@app.route('/logProbes', methods=['POST'])
+def logProbes():
+    return batch_route(call_logFlowProbeHashes)
+
 @app.route('/setRouteId', methods=['POST'])
 def setRouteId():
     data = request.get_json()
 
-    if 'flowId' not in data or 'newRouteId' not in data or 'newEdgeAddr' not in data:
+    if flow_request_error(data, 'newRouteId', 'newEdgeAddr') is not None:
         return jsonify({"error": "Invalid Data"}), HTTPStatus.BAD_REQUEST
     
     newRouteAndEdge = {
@@ -367,8 +563,7 @@ def setRouteId():
 
     tx_hash = call_setRouteId(newRouteAndEdge)
 
-    verify_tx_status(tx_hash)
-
+    # O status fica em `/tx/<hash>`, a requisição não espera a mineração
     return jsonify(tx_hash), HTTPStatus.CREATED
 
 @app.route('/getFlowCompliance/<flowId>', methods=['GET'])
@@ -376,14 +571,7 @@ def getFlowCompliance(flowId):
     status, result = call_getFlowCompliance(flowId)
 
     if status == HTTPStatus.OK:
-        response = [
-            {
-                "success": result["success"], 
-                "fail": result["fail"],
-                "nil": result["nil"], 
-            }, 
-            result["routeId"] 
-        ]
+        response = compliance_response(**result)
     else:
         response = result
 
@@ -408,19 +596,48 @@ def getFlowComplianceOfRouteHistoryIndex(flowId, index):
     status, result = call_getFlowComplianceOfRouteHistoryIndex(flowId, index)
 
     if status == HTTPStatus.OK:
-        response = [
-            {
-                "success": result["success"], 
-                "fail": result["fail"],
-                "nil": result["nil"], 
-            }, 
-            result["routeId"] 
-        ]
+        response = compliance_response(**result)
     else:
         response = result
 
     
     return jsonify(response), status
 
+@app.route('/getFlowComplianceHistory/<flowId>', methods=['GET'])
+def getFlowComplianceHistory(flowId):
+    # Paginação opcional: `?offset=&limit=`
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({"error": "Invalid Data"}), HTTPStatus.BAD_REQUEST
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({"error": "Invalid Data"}), HTTPStatus.BAD_REQUEST
+
+    status, result = call_getFlowComplianceHistory(flowId, offset, limit)
+    return jsonify(result), status
+
+@app.route('/tx/<tx_hash>', methods=['GET'])
+def txStatus(tx_hash):
+    status = receipts.status(tx_hash.lower())
+
+    if status is None:
+        return jsonify({"txHash": tx_hash, "status": "unknown"}), HTTPStatus.NOT_FOUND
+
+    return jsonify(status)
+
+@app.route('/cacheMetrics', methods=['GET'])
+def cacheMetrics():
+    return jsonify(read_cache.stats())
+
+@app.route('/rpcMetrics', methods=['GET'])
+def rpcMetrics():
+    if not isinstance(w3.provider, CoalescingHTTPProvider):
+        return jsonify({"error": "RPC batching is disabled"}), HTTPStatus.NOT_FOUND
+    return jsonify(w3.provider.stats())
+
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Keep-alive: the mininet side reuses its connections (HTTP/1.0 closes them after each response)
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    # Sem debug: o reloader subiria um segundo processo, com outro alocador de nonces para as mesmas contas
+    app.run(debug=False, host='0.0.0.0', port=5000)
@@ -0,0 +1,97 @@
+# Provider HTTP que junta as chamadas concorrentes ao nó num único lote JSON-RPC
+#
+# Cada `make_request` entra numa fila; a thread de despacho espera a primeira e, se já houver outras
+# na fila, junta o que chegar na janela seguinte (ou até `max_batch` chamadas) e envia tudo como um
+# array JSON-RPC. As respostas voltam para quem chamou pelo `id`. Uma chamada sozinha na fila vai na
+# hora, como requisição simples: sem concorrência, a janela não atrasa nada.
+
+import json
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic
+
+from web3 import Web3
+from web3._utils.encoding import Web3JsonEncoder
+
+
+class CoalescingHTTPProvider(Web3.HTTPProvider):
+    def __init__(self, endpoint_uri, window=0.002, max_batch=100, senders=4, **kwargs):
+        """`window`: quanto esperar (em segundos) por outras chamadas quando a primeira não está sozinha na fila.
+        `senders`: lotes enviados ao mesmo tempo"""
+        super().__init__(endpoint_uri, **kwargs)
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = queue.Queue()  # (método, parâmetros, future)
+        self.senders = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="rpc-batch")
+        self.lock = threading.Lock()
+        self.metrics = Counter(requests=0, batches=0, singles=0)
+        self.thread = threading.Thread(target=self.run, name="rpc-coalesce", daemon=True)
+        self.thread.start()
+
+    def make_request(self, method, params):
+        future = Future()
+        self.pending.put((method, params, future))
+        return future.result()
+
+    def run(self):
+        while True:
+            calls = [self.pending.get()]
+            # Sozinha na fila: nada indica que outras estão a caminho
+            deadline = monotonic() + self.window if not self.pending.empty() else 0
+            while len(calls) < self.max_batch:
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    calls.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self.senders.submit(self.send, calls)
+
+    def send(self, calls):
+        with self.lock:
+            self.metrics["requests"] += len(calls)
+            self.metrics["batches" if len(calls) > 1 else "singles"] += 1
+
+        try:
+            if len(calls) == 1:
+                method, params, future = calls[0]
+                future.set_result(super().make_request(method, params))
+                return
+
+            ids = [next(self.request_counter) for _ in calls]
+            request_data = json.dumps(
+                [
+                    {"jsonrpc": "2.0", "method": method, "params": params or [], "id": id}
+                    for id, (method, params, _) in zip(ids, calls)
+                ],
+                cls=Web3JsonEncoder,
+            ).encode('utf-8')
+            raw_response = self._request_session_manager.make_post_request(
+                self.endpoint_uri, request_data, **self.get_request_kwargs()
+            )
+            response = self.decode_rpc_response(raw_response)
+        except Exception as e:
+            for _, _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if not isinstance(response, list):
+            # O nó recusou o lote inteiro: todas recebem o mesmo erro
+            response = [{**response, "id": id} for id in ids]
+        by_id = {item.get("id"): item for item in response}
+
+        for id, (_, _, future) in zip(ids, calls):
+            if id in by_id:
+                future.set_result(by_id[id])
+            else:
+                future.set_result({"jsonrpc": "2.0", "id": id, "error": {"code": -32603, "message": "Missing from the batch response"}})
+
+    def stats(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        sent = metrics["batches"] + metrics["singles"]
+        return {**metrics, "pending": self.pending.qsize(), "requestsPerPost": metrics["requests"] / sent if sent else 0.0}
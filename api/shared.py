@@ -0,0 +1,458 @@
+# Partes comuns às duas versões da API: `main.py` (Flask, Web3) e `asgi.py` (Starlette, AsyncWeb3)
+# Nada aqui faz chamadas RPC: quem conecta ao nó é cada servidor
+
+import json
+import os
+import threading
+from time import monotonic
+
+from eth_abi import decode, encode
+from eth_utils import function_abi_to_4byte_selector, get_abi_input_types, get_abi_output_types, keccak
+from web3 import Web3
+
+CONTRACT_FILE_PATH = "/data/contract-data.json"
+BLOCKCHAIN_HOST = os.getenv('BLOCKCHAIN_HOST', 'http://besu:8545')
+
+## Contas padrão de testes do Besu ##
+# Endereço da conta que fez a implantação
+deployer_address = "0x627306090abaB3A6e1400e9345bC60c78a8BEf57"
+deployer_private_key = "0xc87509a1c067bbde78beb793e6fa76530b6382a4c0241e5e4a9ec0a0f44dc0d3"
+
+# Endereço da controller
+controller_address = "0x627306090abaB3A6e1400e9345bC60c78a8BEf57"
+controller_private_key = "0xc87509a1c067bbde78beb793e6fa76530b6382a4c0241e5e4a9ec0a0f44dc0d3"
+
+# Endereço do nó de saída
+egress_address = "0xf17f52151EbEF6C7334FAD080c5704D77216b732"
+egress_private_key = "0xae6ae8e5ccbfb04590405997ee2d52d2b330726137b875053c36d94e974d162f"
+
+private_keys = {
+    controller_address: controller_private_key,
+    egress_address: egress_private_key,
+}
+
+GAS_LIMIT = 2000000
+# Lotes de probes (`setFlowProbeHashes`, `logFlowProbeHashes`): até PROBE_BATCH_SIZE probes por transação,
+# com gás proporcional ao tamanho do lote
+PROBE_BATCH_SIZE = int(os.getenv('PROBE_BATCH_SIZE', '64'))
+BATCH_BASE_GAS = 100000
+BATCH_ITEM_GAS = 60000
+# Chamadas por lote JSON-RPC enviado ao nó (o Besu recusa lotes acima de 1024)
+RPC_BATCH_SIZE = int(os.getenv('RPC_BATCH_SIZE', '100'))
+# Intervalo entre as buscas de recibos, que também renovam o bloco do cache de leituras
+RECEIPT_POLL_INTERVAL = float(os.getenv('RECEIPT_POLL_INTERVAL', '1.0'))
+# Buscas sem renovar o bloco até o cache passar a ler 'latest'
+STALE_BLOCK_POLLS = 5
+# Transações sem recibo depois desse tempo (em segundos) deixam de ser acompanhadas: status "dropped"
+RECEIPT_MAX_AGE = float(os.getenv('RECEIPT_MAX_AGE', '600'))
+GAS_PRICE = Web3.to_wei('20', 'gwei')
+REF_SIG_GAS_PRICE = Web3.to_wei('30', 'gwei')
+
+# Função do contrato -> (conta que assina, preço do gás)
+TX_FUNCTIONS = {
+    'echo': (controller_address, GAS_PRICE),
+    'newFlow': (controller_address, GAS_PRICE),
+    'setFlowProbeHash': (controller_address, REF_SIG_GAS_PRICE),
+    'logFlowProbeHash': (egress_address, GAS_PRICE),
+    'setFlowProbeHashes': (controller_address, REF_SIG_GAS_PRICE),
+    'logFlowProbeHashes': (egress_address, GAS_PRICE),
+    'setRouteId': (controller_address, GAS_PRICE),
+}
+
+# Erros do nó que indicam que o nonce local ficou fora de sincronia
+NONCE_ERRORS = ('nonce too low', 'replacement transaction underpriced', 'replacement underpriced')
+# O nó já tem essa mesma transação assinada (um reenvio): não é erro, o hash é o dela
+KNOWN_TX_ERRORS = ('known transaction', 'already known')
+
+PROBE_KEYS = ['flowId', 'routeId', 'timestamp', 'lightMultSig']
+
+
+def is_nonce_error(message):
+    message = message.lower().replace('_', ' ')
+    return any(error in message for error in NONCE_ERRORS)
+
+
+def is_known_tx_error(message):
+    message = message.lower().replace('_', ' ')
+    return any(error in message for error in KNOWN_TX_ERRORS)
+
+
+def load_contract_data(path=CONTRACT_FILE_PATH):
+    """Nome, endereço e abi do contrato implantado pelo deployer.
+    PoTFactory e PoTLedger têm a mesma interface: a API usa qualquer um dos dois.
+    Contratos anteriores (flowId string, sem as funções de lote) não são suportados: `function_abi` falha ao iniciar"""
+    with open(path, "r") as f:
+        data = json.load(f)
+
+    # Sem o nome no arquivo, é a PoTFactory (o padrão do deployer)
+    return data.get("contract_name", "PoTFactory"), data["contract_address"], data["abi"]
+
+
+# Os campos JSON da API continuam os mesmos (strings); o contrato guarda tipos compactos:
+# flowId -> bytes32, timestamp -> uint32, lightMultSig -> bytes4. A conversão segue o tipo no ABI.
+def flow_id_bytes(flowId):
+    """O flowId é o sha256 do flow em hex (64 caracteres); qualquer outra string vira o seu keccak256"""
+    hex_id = flowId[2:] if flowId.startswith('0x') else flowId
+    if len(hex_id) == 64:
+        try:
+            return bytes.fromhex(hex_id)
+        except ValueError:
+            pass
+    return keccak(text=flowId)
+
+
+def hex_uint(value, size):
+    """Inteiro de `size` bytes a partir de uma string hex ("0x1a2b") ou de um número. Lança ValueError se não couber"""
+    number = value if isinstance(value, int) else int(value, 16)
+    if not 0 <= number < 1 << (8 * size):
+        raise ValueError(f"{value} does not fit in {size} bytes")
+    return number
+
+
+def to_abi_arg(abi_type, value):
+    if abi_type.endswith('[]'):
+        return [to_abi_arg(abi_type[:-2], item) for item in value]
+    if abi_type == 'bytes32' and isinstance(value, str):
+        return flow_id_bytes(value)
+    if abi_type == 'uint32':
+        return hex_uint(value, 4)
+    if abi_type == 'bytes4':
+        return hex_uint(value, 4).to_bytes(4, 'big')
+    return value
+
+
+def abi_args(arg_types, args):
+    return tuple(to_abi_arg(abi_type, arg) for abi_type, arg in zip(arg_types, args))
+
+
+def probe_error(item):
+    """Por que o probe (objeto JSON) é inválido, ou None"""
+    if not isinstance(item, dict):
+        return "Not an object"
+    missing = [key for key in PROBE_KEYS if key not in item]
+    if missing:
+        return "Missing " + ", ".join(missing)
+    if not isinstance(item['flowId'], str):
+        return "Invalid value: flowId must be a string"
+    try:
+        hex_uint(item['timestamp'], 4)
+        hex_uint(item['lightMultSig'], 4)
+    except (TypeError, ValueError) as e:
+        return f"Invalid value: {e}"
+    return None
+
+
+def flow_request_error(data, route_key, edge_key):
+    """Por que o corpo de `deployFlowContract` ou `setRouteId` (flowId, rota e nó de saída) é inválido, ou None"""
+    if not isinstance(data, dict):
+        return "Not an object"
+    missing = [key for key in ('flowId', route_key, edge_key) if key not in data]
+    if missing:
+        return "Missing " + ", ".join(missing)
+    if not isinstance(data['flowId'], str) or not isinstance(data[route_key], str):
+        return f"Invalid value: flowId and {route_key} must be strings"
+    if not Web3.is_address(data[edge_key]):
+        return f"Invalid value: {edge_key} is not an address"
+    return None
+
+
+def function_abi(abi, function_name):
+    """Entrada do ABI da função `function_name`. Lança ValueError se o contrato implantado não a tiver"""
+    fn_abi = next((entry for entry in abi if entry.get('type') == 'function' and entry['name'] == function_name), None)
+    if fn_abi is None:
+        raise ValueError(f"The deployed contract has no function {function_name}: redeploy it with the current deployer")
+    return fn_abi
+
+
+# Transação pré-montada de uma função do contrato: por chamada só mudam os argumentos e o nonce
+class TxTemplate:
+    def __init__(self, abi, contract_address, function_name, from_address, gas_price, chain_id, gas=GAS_LIMIT):
+        fn_abi = function_abi(abi, function_name)
+        self.selector = function_abi_to_4byte_selector(fn_abi)
+        self.arg_types = get_abi_input_types(fn_abi)
+        self.from_address = from_address
+        self.fields = {
+            'to': Web3.to_checksum_address(contract_address),
+            'value': 0,
+            'gas': gas,
+            'gasPrice': gas_price,
+            'chainId': chain_id,
+        }
+
+    def builder(self, *args, gas=None):
+        """Codifica os argumentos agora; retorna a função que monta a transação para um nonce"""
+        data = self.selector + encode(self.arg_types, abi_args(self.arg_types, args))
+        fields = self.fields if gas is None else {**self.fields, 'gas': gas}
+
+        def build_tx(nonce):
+            return {**fields, 'nonce': nonce, 'data': data}
+        return build_tx
+
+
+def build_tx_templates(abi, contract_address, chain_id):
+    return {
+        name: TxTemplate(abi, contract_address, name, from_address, gas_price, chain_id)
+        for name, (from_address, gas_price) in TX_FUNCTIONS.items()
+    }
+
+
+# Leitura (`eth_call`) montada sem o web3, para ir num lote JSON-RPC junto com outras
+class CallTemplate:
+    def __init__(self, abi, contract_address, function_name):
+        fn_abi = function_abi(abi, function_name)
+        self.selector = function_abi_to_4byte_selector(fn_abi)
+        self.arg_types = get_abi_input_types(fn_abi)
+        self.output_types = get_abi_output_types(fn_abi)
+        self.to = Web3.to_checksum_address(contract_address)
+
+    def request(self, *args, block=None):
+        """`(método, parâmetros)` da chamada, no formato de `make_batch_request`"""
+        data = self.selector + encode(self.arg_types, abi_args(self.arg_types, args))
+        return ('eth_call', [{'to': self.to, 'data': '0x' + data.hex()}, hex(block) if block is not None else 'latest'])
+
+    def decode(self, result):
+        return decode(self.output_types, bytes.fromhex(result[2:]))
+
+    def result(self, response):
+        """Decodifica uma resposta JSON-RPC da chamada. Lança ValueError com a mensagem do nó se ela falhou"""
+        if 'error' in response:
+            raise ValueError(response['error']['message'])
+        return self.decode(response['result'])
+
+
+READ_FUNCTIONS = ('getFlowCompliance', 'getFlowSizeRoutesHistory', 'getFlowComplianceOfRouteHistoryIndex')
+
+
+def build_call_templates(abi, contract_address):
+    return {name: CallTemplate(abi, contract_address, name) for name in READ_FUNCTIONS}
+
+
+def history_requests(call_templates, flowId, indexes, block):
+    """Chamadas da rota atual e das rotas `indexes` do histórico de um flow, no mesmo bloco.
+    Enviadas em lotes de até RPC_BATCH_SIZE (`chunked`)"""
+    return [call_templates['getFlowCompliance'].request(flowId, block=block)] + [
+        call_templates['getFlowComplianceOfRouteHistoryIndex'].request(flowId, index, block=block) for index in indexes
+    ]
+
+
+def history_result(call_templates, batches):
+    """Decodifica as respostas dos lotes de `history_requests`, na ordem: `(rota atual, [rotas do histórico])`.
+    Lança ValueError com a mensagem do nó se algum lote ou chamada falhou"""
+    responses = []
+    for batch in batches:
+        if isinstance(batch, dict):
+            # O nó recusou o lote inteiro
+            raise ValueError(batch['error']['message'])
+        responses.extend(batch)
+
+    current = call_templates['getFlowCompliance'].result(responses[0])
+    history = [call_templates['getFlowComplianceOfRouteHistoryIndex'].result(response) for response in responses[1:]]
+    return current, history
+
+
+def history_page(size, offset, limit):
+    """Índices do histórico na página pedida (`limit` None: até o fim)"""
+    end = size if limit is None else min(size, offset + limit)
+    return range(min(offset, size), end)
+
+
+def compliance_history_response(flowId, size, offset, current, history):
+    return {
+        "flowId": flowId,
+        "size": size,
+        "offset": offset,
+        "history": [compliance_response(*route) for route in history],
+        "current": compliance_response(*current),
+    }
+
+
+# Lê um lote: array JSON ou NDJSON (um objeto por linha). Lança ValueError se o JSON for inválido
+def parse_batch(body):
+    body = body.strip()
+    if body.startswith('['):
+        items = json.loads(body)
+    else:
+        items = [json.loads(line) for line in body.splitlines() if line.strip()]
+
+    errors = {i: error for i, error in enumerate(map(probe_error, items)) if error is not None}
+    return items, errors
+
+
+def probe_batches(items, arg_keys, size=PROBE_BATCH_SIZE):
+    """Divide os itens em transações de lote: `(argumentos (um array por chave), gás, nº de itens)`"""
+    batches = []
+    for start in range(0, len(items), size):
+        chunk = items[start:start + size]
+        args = [[item[key] for item in chunk] for key in arg_keys]
+        batches.append((args, BATCH_BASE_GAS + BATCH_ITEM_GAS * len(chunk), len(chunk)))
+    return batches
+
+
+def batch_results(tx_hashes, error, batch_sizes):
+    """Resultado por item de um lote: o hash da transação que o levou e a sua posição nela
+    (a de `skipped` em `/tx/<hash>`), ou o erro que interrompeu o envio"""
+    results = []
+    for tx_hash, n_items in zip(tx_hashes, batch_sizes):
+        results.extend({"txHash": tx_hash, "index": index} for index in range(n_items))
+    if error is not None:
+        # Os nonces seguintes ficariam com um buraco: o resto do lote não é enviado
+        failed = batch_sizes[len(tx_hashes)]
+        results.extend({"error": error} for _ in range(failed))
+        results.extend({"error": "Not sent, a previous item failed"} for _ in range(sum(batch_sizes) - len(results)))
+    return results
+
+
+def with_item_errors(errors, results):
+    """Intercala os erros de validação (`{índice: motivo}`) com os resultados dos itens válidos, na ordem do lote"""
+    sent = iter(results)
+    return [
+        {"error": f"Invalid Data: {errors[i]}"} if i in errors else next(sent)
+        for i in range(len(errors) + len(results))
+    ]
+
+
+def chunked(items, size=RPC_BATCH_SIZE):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def receipt_status(tx_hash, receipt, probes=None):
+    """Status final de uma transação a partir do recibo cru (`eth_getTransactionReceipt`).
+    Numa transação de lote (`probes`, de `probe_keys`), `skipped` lista os itens que o contrato pulou"""
+    status = {
+        "txHash": tx_hash,
+        "status": "success" if int(receipt['status'], 16) == 1 else "failed",
+        "blockNumber": int(receipt['blockNumber'], 16),
+        "gasUsed": int(receipt['gasUsed'], 16),
+    }
+    if probes is not None and status["status"] == "success":
+        status["skipped"] = [
+            {"index": index, "flowId": '0x' + probes[index][0].hex(), "timestamp": hex(probes[index][1])}
+            for index in skipped_probes(receipt, probes)
+        ]
+    return status
+
+
+# Primeiro tópico dos logs de `ProbeSkipped(bytes32 indexed flowId, uint32 id_x)`
+PROBE_SKIPPED_TOPIC = '0x' + keccak(text='ProbeSkipped(bytes32,uint32)').hex()
+
+
+def probe_keys(items):
+    """`(flowId, timestamp)` de cada item como o contrato os recebe, para casar com os eventos ProbeSkipped"""
+    return [(flow_id_bytes(item['flowId']), hex_uint(item['timestamp'], 4)) for item in items]
+
+
+def skipped_probes(receipt, probes):
+    """Posições em `probes` dos itens pulados, pelos logs ProbeSkipped do recibo.
+    Os eventos saem na ordem dos itens, então um item repetido casa com a próxima ocorrência dele"""
+    skipped = []
+    start = 0
+    for log in receipt.get('logs', []):
+        topics = log['topics']
+        if len(topics) != 2 or topics[0].lower() != PROBE_SKIPPED_TOPIC:
+            continue
+        key = (bytes.fromhex(topics[1][2:]), int(log['data'], 16))
+        index = next((i for i in range(start, len(probes)) if probes[i] == key), None)
+        if index is not None:
+            skipped.append(index)
+            start = index + 1
+    return skipped
+
+
+def dropped_status(tx_hash, sent_at):
+    """Status final de uma transação que ficou sem recibo por mais de RECEIPT_MAX_AGE"""
+    return {"txHash": tx_hash, "status": "dropped", "sentAt": sent_at}
+
+
+def compliance_response(success, fail, nil, routeId):
+    return [
+        {
+            "success": success,
+            "fail": fail,
+            "nil": nil,
+        },
+        routeId
+    ]
+
+
+# Cache das leituras do contrato (`eth_call`), por (função, argumentos, bloco)
+# O bloco atual vem de quem acompanha a chain: ao mudar, todas as entradas caem. Uma transação
+# enviada por esta API para um flow também descarta as leituras desse flow (o primeiro argumento).
+class ReadCache:
+    def __init__(self, max_entries=100000, max_block_age=STALE_BLOCK_POLLS * RECEIPT_POLL_INTERVAL):
+        """Leituras do contrato no último bloco conhecido, separadas por fluxo.
+        Se o bloco não é renovado há mais de `max_block_age` segundos, as leituras vão para 'latest', sem cache"""
+        self.max_entries = max_entries
+        self.max_block_age = max_block_age
+        self.lock = threading.Lock()
+        self.block = None
+        self.block_time = None
+        self.flows = {}  # flowId -> {(função, args): valor}
+        self.size = 0
+        # Escritas por fluxo neste bloco: uma leitura feita antes de uma escrita não é guardada
+        self.flow_versions = {}
+        self.metrics = {"hits": 0, "misses": 0, "blocks": 0, "flowInvalidations": 0, "staleReads": 0}
+
+    def set_block(self, block):
+        with self.lock:
+            self.block_time = monotonic()
+            if block != self.block:
+                self.block = block
+                self.flows.clear()
+                self.size = 0
+                # As leituras ainda em curso são do bloco anterior e já não seriam guardadas
+                self.flow_versions.clear()
+                self.metrics["blocks"] += 1
+
+    @staticmethod
+    def key_args(args):
+        # "0xABC…" e "abc…" são o mesmo flow: a chave usa o bytes32 que o contrato recebe
+        return (flow_id_bytes(args[0]),) + tuple(args[1:])
+
+    def lookup(self, function_name, args):
+        """Retorna `(True, valor)` se estiver no cache; senão `(False, token)`, a ser passado para `store`.
+        O bloco da leitura está no token, `None` para 'latest'"""
+        args = self.key_args(args)
+        with self.lock:
+            flow_id = args[0]
+            block = self.block
+            if block is not None and monotonic() - self.block_time > self.max_block_age:
+                # O tracker não renova o bloco: melhor ler o estado atual do que um bloco velho
+                block = None
+                self.metrics["staleReads"] += 1
+            elif (function_name, args) in self.flows.get(flow_id, ()):
+                self.metrics["hits"] += 1
+                return True, self.flows[flow_id][(function_name, args)]
+
+            self.metrics["misses"] += 1
+            return False, ((function_name, args, block), self.flow_versions.get(flow_id))
+
+    def store(self, token, value):
+        (function_name, args, block), flow_version = token
+        with self.lock:
+            # Não guarda uma leitura que ficou velha enquanto era feita
+            if block is None or block != self.block or flow_version != self.flow_versions.get(args[0]):
+                return
+            if self.size >= self.max_entries:
+                self.flows.clear()
+                self.size = 0
+            entries = self.flows.setdefault(args[0], {})
+            if (function_name, args) not in entries:
+                self.size += 1
+            entries[(function_name, args)] = value
+
+    def invalidate_flow(self, flow_id):
+        flow_id = flow_id_bytes(flow_id)
+        with self.lock:
+            self.flow_versions[flow_id] = self.flow_versions.get(flow_id, 0) + 1
+            self.size -= len(self.flows.pop(flow_id, ()))
+            self.metrics["flowInvalidations"] += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                **self.metrics,
+                "entries": self.size,
+                "block": self.block,
+                "hitRate": self.metrics["hits"] / lookups if lookups else 0.0,
+            }
@@ -5,17 +5,24 @@ contract ProofOfTransit{
     address private controller;
     uint private startTime;
     
-    mapping(string => string) public probHash;
+    // Reference signature of a probe, by timestamp. `isSet` tells an unset reference from a zero signature
+    struct probeRef{
+        bytes4 sig;
+        bool isSet;
+    }
+
+    mapping(uint32 => probeRef) public probHash;
     logStructure public currentRouteIdAudit;
 
+    // Counters and timestamp share one slot, so logging a probe writes a single slot
     struct logStructure{
-        uint probeFailAmount;
-        uint probeNullAmount;
-        uint probeSuccessAmount;
+        uint64 probeFailAmount;
+        uint64 probeNullAmount;
+        uint64 probeSuccessAmount;
+        uint32 lastTimestamp;
 
-        string routeId;
         address egressEdge;
-        uint lastTimestamp;
+        string routeId;
     }
 
     logStructure[] public routesHistory;
@@ -53,7 +60,7 @@ contract ProofOfTransit{
     }
 
     function changeRouteIdAndEgressEdge(string memory newRouteId, address newEgressEdge, address senderAddr) public isController(senderAddr) {
-        currentRouteIdAudit.lastTimestamp = block.timestamp;
+        currentRouteIdAudit.lastTimestamp = uint32(block.timestamp);
 
         routesHistory.push(currentRouteIdAudit);
 
@@ -70,16 +77,18 @@ contract ProofOfTransit{
         return controller;
     }
 
-    function setProbeHash(string memory id_x, string memory hash, address senderAddr) public isController(senderAddr) {
-        probHash[id_x] = hash;
+    function setProbeHash(uint32 id_x, bytes4 hash, address senderAddr) public isController(senderAddr) {
+        probHash[id_x] = probeRef(hash, true);
     }
 
     event ProbeFail();
 
-    function logProbe(string memory id_x,string memory sig, address senderAddr) public isEgressEdge(senderAddr){
-        if (compareStrings(probHash[id_x],"")) {
+    function logProbe(uint32 id_x, bytes4 sig, address senderAddr) public isEgressEdge(senderAddr){
+        probeRef memory ref = probHash[id_x];
+
+        if (!ref.isSet) {
             currentRouteIdAudit.probeNullAmount += 1;
-        } else if (compareStrings(probHash[id_x],sig)){
+        } else if (ref.sig == sig){
             currentRouteIdAudit.probeSuccessAmount += 1;
         } else {
             currentRouteIdAudit.probeFailAmount += 1;
@@ -104,21 +113,17 @@ contract ProofOfTransit{
                 routesHistory[index].probeNullAmount,
                 routesHistory[index].routeId);
     }
-
-    /* AUX FUNCTIONS */
-    function compareStrings(string memory a, string memory b) internal pure returns (bool) {
-        return (keccak256(abi.encodePacked((a))) == keccak256(abi.encodePacked((b))));
-    }
-
 }
 
 contract PoTFactory{
-    mapping(string => ProofOfTransit) private flowPOT;
-    mapping(string => address) public flowAddr;
+    mapping(bytes32 => ProofOfTransit) private flowPOT;
+    mapping(bytes32 => address) public flowAddr;
 
     event Echo(string message);
+    // A batch entry of an unregistered flow, or one the sender may not write, is skipped instead of reverting the batch
+    event ProbeSkipped(bytes32 indexed flowId, uint32 id_x);
 
-    modifier isFlowRegistered(string memory flowId){
+    modifier isFlowRegistered(bytes32 flowId){
         require(flowAddr[flowId] != address(0), "No flow is registered with the provided flow ID");
         _;
     }
@@ -127,32 +132,70 @@ contract PoTFactory{
         emit Echo(message);
     }
 
-    function newFlow(string memory flowId, address egress_edgeAddr, string memory routeId) public{
+    function newFlow(bytes32 flowId, address egress_edgeAddr, string memory routeId) public{
         ProofOfTransit new_pot = new ProofOfTransit(msg.sender,egress_edgeAddr,routeId);
 
         flowPOT[flowId] = new_pot;
         flowAddr[flowId] = address(new_pot);
     }
 
-    function setFlowProbeHash(string memory flowId, string memory id_x, string memory hash) public isFlowRegistered(flowId){
+    function setFlowProbeHash(bytes32 flowId, uint32 id_x, bytes4 hash) public isFlowRegistered(flowId){
         ProofOfTransit pot = ProofOfTransit(flowPOT[flowId]);
         
         pot.setProbeHash(id_x,hash,msg.sender);
     }
 
-    function logFlowProbeHash(string memory flowId, string memory id_x, string memory hash) public isFlowRegistered(flowId){
+    function logFlowProbeHash(bytes32 flowId, uint32 id_x, bytes4 hash) public isFlowRegistered(flowId){
         ProofOfTransit pot = ProofOfTransit(flowPOT[flowId]);
         
         pot.logProbe(id_x,hash,msg.sender);
     }
 
-    function setRouteId(string memory flowId, string memory newRouteID, address newEgressEdge) public isFlowRegistered(flowId){
+    // Batches: one transaction for many probes, possibly of different flows.
+    // Entries that would revert on their own are skipped (see ProbeSkipped); returns how many were
+    function setFlowProbeHashes(bytes32[] calldata flowIds, uint32[] calldata ids_x, bytes4[] calldata hashes) external returns (uint skipped){
+        require(flowIds.length == ids_x.length && flowIds.length == hashes.length, "Batch arrays must have the same length");
+
+        for (uint i = 0; i < flowIds.length; i++) {
+            address pot = flowAddr[flowIds[i]];
+            if (pot == address(0)) {
+                skipped += 1;
+                emit ProbeSkipped(flowIds[i], ids_x[i]);
+                continue;
+            }
+            try ProofOfTransit(pot).setProbeHash(ids_x[i], hashes[i], msg.sender) {
+            } catch {
+                skipped += 1;
+                emit ProbeSkipped(flowIds[i], ids_x[i]);
+            }
+        }
+    }
+
+    function logFlowProbeHashes(bytes32[] calldata flowIds, uint32[] calldata ids_x, bytes4[] calldata hashes) external returns (uint skipped){
+        require(flowIds.length == ids_x.length && flowIds.length == hashes.length, "Batch arrays must have the same length");
+
+        for (uint i = 0; i < flowIds.length; i++) {
+            address pot = flowAddr[flowIds[i]];
+            if (pot == address(0)) {
+                skipped += 1;
+                emit ProbeSkipped(flowIds[i], ids_x[i]);
+                continue;
+            }
+            try ProofOfTransit(pot).logProbe(ids_x[i], hashes[i], msg.sender) {
+            } catch {
+                skipped += 1;
+                emit ProbeSkipped(flowIds[i], ids_x[i]);
+            }
+        }
+    }
+
+    function setRouteId(bytes32 flowId, string memory newRouteID, address newEgressEdge) public isFlowRegistered(flowId){
         ProofOfTransit pot = ProofOfTransit(flowPOT[flowId]);
         
         pot.changeRouteIdAndEgressEdge(newRouteID, newEgressEdge, msg.sender);
     }
 
-    function getFlowSizeRoutesHistory(string memory flowId) public view isFlowRegistered(flowId) returns (uint sizeRoutesHistory){
+    function getFlowSizeRoutesHistory(bytes32 flowId) public view isFlowRegistered(flowId) returns (uint sizeRoutesHistory){
         ProofOfTransit pot = ProofOfTransit(flowPOT[flowId]);
 
         sizeRoutesHistory = pot.getSizeRoutesHistory();
@@ -160,7 +203,7 @@ contract PoTFactory{
         return sizeRoutesHistory;
     }     
 
-    function getFlowCompliance(string memory flowId) public view isFlowRegistered(flowId) returns (uint success, uint fail, uint nil, string memory routeId){
+    function getFlowCompliance(bytes32 flowId) public view isFlowRegistered(flowId) returns (uint success, uint fail, uint nil, string memory routeId){
         ProofOfTransit pot = ProofOfTransit(flowPOT[flowId]);
 
         (success, fail, nil, routeId) = pot.getCompliance();
@@ -168,11 +211,162 @@ contract PoTFactory{
         return (success, fail, nil, routeId);
     }
 
-    function getFlowComplianceOfRouteHistoryIndex(string memory flowId, uint index) public view isFlowRegistered(flowId) returns (uint success, uint fail, uint nil, string memory routeId){
+    function getFlowComplianceOfRouteHistoryIndex(bytes32 flowId, uint index) public view isFlowRegistered(flowId) returns (uint success, uint fail, uint nil, string memory routeId){
         ProofOfTransit pot = ProofOfTransit(flowPOT[flowId]);
 
         (success, fail, nil, routeId) = pot.getComplianceOfRouteHistoryIndex(index);
 
         return (success, fail, nil, routeId);
     }
-}
\ No newline at end of file
+}
+
+// Same external interface as PoTFactory, but every flow lives in this contract's storage:
+// registering a flow writes a few slots instead of deploying a ProofOfTransit, and probes
+// skip the external call to the flow's contract
+contract PoTLedger{
+    struct flowStructure{
+        address controller;
+        uint32 generation; // Bumped by newFlow: references and history of a previous registration are ignored
+
+        ProofOfTransit.logStructure currentRouteIdAudit;
+    }
+
+    mapping(bytes32 => flowStructure) private flows;
+    // flowId -> generation -> timestamp -> reference signature
+    mapping(bytes32 => mapping(uint32 => mapping(uint32 => ProofOfTransit.probeRef))) private probHash;
+    // flowId -> generation -> previous routes. Starting over costs the same whatever the size of the old history
+    mapping(bytes32 => mapping(uint32 => ProofOfTransit.logStructure[])) private routesHistory;
+
+    event Echo(string message);
+    // Unlike ProofOfTransit's ProbeFail(), emitted by each flow's own contract, every flow shares this
+    // contract's address here: the flow is in the event. Listeners filter on this signature for PoTLedger
+    event ProbeFail(bytes32 indexed flowId);
+    // A batch entry of an unregistered flow, or one the sender may not write, is skipped instead of reverting the batch
+    event ProbeSkipped(bytes32 indexed flowId, uint32 id_x);
+
+    modifier isFlowRegistered(bytes32 flowId){
+        require(flows[flowId].controller != address(0), "No flow is registered with the provided flow ID");
+        _;
+    }
+
+    modifier isController(bytes32 flowId) {
+        require(msg.sender == flows[flowId].controller, "Caller is not controller");
+        _;
+    }
+
+    modifier isEgressEdge(bytes32 flowId) {
+        require(msg.sender == flows[flowId].currentRouteIdAudit.egressEdge, "Caller is not egress edge");
+        _;
+    }
+
+    function echo(string calldata message) external {
+        emit Echo(message);
+    }
+
+    // The flow's state is kept here: this contract's address for a registered flow, as PoTFactory gives its contract
+    function flowAddr(bytes32 flowId) external view returns (address) {
+        return flows[flowId].controller != address(0) ? address(this) : address(0);
+    }
+
+    function newFlow(bytes32 flowId, address egress_edgeAddr, string memory routeId) public{
+        flowStructure storage flow = flows[flowId];
+
+        // Like deploying a new ProofOfTransit: a registered flow starts over
+        flow.controller = msg.sender;
+        flow.generation += 1;
+        flow.currentRouteIdAudit = newAudit(egress_edgeAddr, routeId);
+    }
+
+    function setFlowProbeHash(bytes32 flowId, uint32 id_x, bytes4 hash) public isFlowRegistered(flowId) isController(flowId){
+        storeProbeHash(flowId, id_x, hash);
+    }
+
+    function logFlowProbeHash(bytes32 flowId, uint32 id_x, bytes4 hash) public isFlowRegistered(flowId) isEgressEdge(flowId){
+        auditProbe(flowId, id_x, hash);
+    }
+
+    // Batches: one transaction for many probes, possibly of different flows.
+    // Entries that would revert on their own are skipped (see ProbeSkipped); returns how many were
+    function setFlowProbeHashes(bytes32[] calldata flowIds, uint32[] calldata ids_x, bytes4[] calldata hashes) external returns (uint skipped){
+        require(flowIds.length == ids_x.length && flowIds.length == hashes.length, "Batch arrays must have the same length");
+
+        for (uint i = 0; i < flowIds.length; i++) {
+            // An unregistered flow has no controller, so this also skips it
+            if (msg.sender != flows[flowIds[i]].controller) {
+                skipped += 1;
+                emit ProbeSkipped(flowIds[i], ids_x[i]);
+                continue;
+            }
+            storeProbeHash(flowIds[i], ids_x[i], hashes[i]);
+        }
+    }
+
+    function logFlowProbeHashes(bytes32[] calldata flowIds, uint32[] calldata ids_x, bytes4[] calldata hashes) external returns (uint skipped){
+        require(flowIds.length == ids_x.length && flowIds.length == hashes.length, "Batch arrays must have the same length");
+
+        for (uint i = 0; i < flowIds.length; i++) {
+            flowStructure storage flow = flows[flowIds[i]];
+            if (flow.controller == address(0) || msg.sender != flow.currentRouteIdAudit.egressEdge) {
+                skipped += 1;
+                emit ProbeSkipped(flowIds[i], ids_x[i]);
+                continue;
+            }
+            auditProbe(flowIds[i], ids_x[i], hashes[i]);
+        }
+    }
+
+    function setRouteId(bytes32 flowId, string memory newRouteID, address newEgressEdge) public isFlowRegistered(flowId) isController(flowId){
+        flowStructure storage flow = flows[flowId];
+
+        flow.currentRouteIdAudit.lastTimestamp = uint32(block.timestamp);
+        routesHistory[flowId][flow.generation].push(flow.currentRouteIdAudit);
+
+        flow.currentRouteIdAudit = newAudit(newEgressEdge, newRouteID);
+    }
+
+    function getFlowSizeRoutesHistory(bytes32 flowId) public view isFlowRegistered(flowId) returns (uint sizeRoutesHistory){
+        return routesHistory[flowId][flows[flowId].generation].length;
+    }
+
+    function getFlowCompliance(bytes32 flowId) public view isFlowRegistered(flowId) returns (uint success, uint fail, uint nil, string memory routeId){
+        ProofOfTransit.logStructure storage audit = flows[flowId].currentRouteIdAudit;
+
+        return (audit.probeSuccessAmount, audit.probeFailAmount, audit.probeNullAmount, audit.routeId);
+    }
+
+    function getFlowComplianceOfRouteHistoryIndex(bytes32 flowId, uint index) public view isFlowRegistered(flowId) returns (uint success, uint fail, uint nil, string memory routeId){
+        ProofOfTransit.logStructure storage audit = routesHistory[flowId][flows[flowId].generation][index];
+
+        return (audit.probeSuccessAmount, audit.probeFailAmount, audit.probeNullAmount, audit.routeId);
+    }
+
+    /* AUX FUNCTIONS */
+    function storeProbeHash(bytes32 flowId, uint32 id_x, bytes4 hash) internal {
+        probHash[flowId][flows[flowId].generation][id_x] = ProofOfTransit.probeRef(hash, true);
+    }
+
+    function auditProbe(bytes32 flowId, uint32 id_x, bytes4 hash) internal {
+        flowStructure storage flow = flows[flowId];
+        ProofOfTransit.probeRef memory ref = probHash[flowId][flow.generation][id_x];
+
+        if (!ref.isSet) {
+            flow.currentRouteIdAudit.probeNullAmount += 1;
+        } else if (ref.sig == hash){
+            flow.currentRouteIdAudit.probeSuccessAmount += 1;
+        } else {
+            flow.currentRouteIdAudit.probeFailAmount += 1;
+            emit ProbeFail(flowId);
+        }
+    }
+
+    function newAudit(address egressEdge, string memory routeId) internal pure returns (ProofOfTransit.logStructure memory) {
+        return ProofOfTransit.logStructure({
+            probeFailAmount: 0,
+            probeNullAmount: 0,
+            probeSuccessAmount: 0,
+            lastTimestamp: 0,
+            egressEdge: egressEdge,
+            routeId: routeId
+        });
+    }
+}
@@ -3,8 +3,12 @@
 
 const { buildModule } = require("@nomicfoundation/hardhat-ignition/modules");
 
-module.exports = buildModule("PoTFactoryModule", (m) => {
-  const potFactory = m.contract("PoTFactory", []);
+// POT_CONTRACT picks the layout: "PoTFactory" (one ProofOfTransit contract per flow, the default)
+// or "PoTLedger" (every flow kept in a single contract). Both have the same interface.
+const POT_CONTRACT = process.env.POT_CONTRACT || "PoTFactory";
 
-  return { potFactory };
-});
\ No newline at end of file
+module.exports = buildModule(`${POT_CONTRACT}Module`, (m) => {
+  const pot = m.contract(POT_CONTRACT, []);
+
+  return { pot };
+});
@@ -8,16 +8,18 @@ const path = require("path");
 const PoTModule = require("../ignition/modules/PoT.js");
 
 // 2. Defina o nome do contrato (para encontrar o ABI)
-const CONTRACT_NAME = "PoT";
+// POT_CONTRACT escolhe o contrato implantado: PoTFactory (padrão) ou PoTLedger
+const SOURCE_NAME = "PoT";
+const CONTRACT_NAME = process.env.POT_CONTRACT || "PoTFactory";
 
 async function main() {
   console.log("Iniciando deploy com Hardhat Ignition (via script)...");
 
   // 3. Chame o deploy do Ignition e espere o resultado
-  const { potFactory } = await hre.ignition.deploy(PoTModule);
+  const { pot } = await hre.ignition.deploy(PoTModule);
   
   // 4. O deploy terminou! Agora temos o contrato.
-  const contractAddress = await potFactory.getAddress();
+  const contractAddress = await pot.getAddress();
   console.log(`Contrato '${CONTRACT_NAME}' deployado em: ${contractAddress}`);
 
   // 5. Encontre e leia o ABI (como fizemos antes)
@@ -25,7 +27,7 @@ async function main() {
   try {
     const abiPath = path.join(
       hre.config.paths.artifacts, // Ex: /app/artifacts
-      `contracts/${CONTRACT_NAME}.sol/${CONTRACT_NAME}Factory.json`
+      `contracts/${SOURCE_NAME}.sol/${CONTRACT_NAME}.json`
     );
     const abiFile = fs.readFileSync(abiPath, "utf8");
     abi = JSON.parse(abiFile).abi;
@@ -34,8 +36,9 @@ async function main() {
     process.exit(1);
   }
 
-  // 6. Salve o endereço E o ABI no volume compartilhado
+  // 6. Salve o endereço, o nome E o ABI no volume compartilhado
   const outputData = {
+    contract_name: CONTRACT_NAME,
     contract_address: contractAddress,
     abi: abi,
   };
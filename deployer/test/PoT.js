@@ -0,0 +1,73 @@
+const { expect } = require("chai");
+const { ethers } = require("hardhat");
+const { loadFixture } = require("@nomicfoundation/hardhat-toolbox/network-helpers");
+
+// Both layouts share the batch interface: entries that would revert on their own are skipped with ProbeSkipped
+for (const contractName of ["PoTFactory", "PoTLedger"]) {
+  describe(`${contractName} batches`, function () {
+    const SIG = "0xdeadbeef";
+
+    async function deployFixture() {
+      const [controller, egress, other] = await ethers.getSigners();
+      const pot = await ethers.deployContract(contractName);
+
+      const flow = ethers.id("flow");
+      // Registered by another controller: `controller` may not write its references
+      const otherFlow = ethers.id("other flow");
+      const unregistered = ethers.id("unregistered");
+      await pot.connect(controller).newFlow(flow, egress.address, "1234");
+      await pot.connect(other).newFlow(otherFlow, egress.address, "5678");
+
+      return { pot, controller, egress, other, flow, otherFlow, unregistered };
+    }
+
+    // `[flowId, id_x]` of every ProbeSkipped of a transaction, in order
+    async function skippedOf(pot, tx) {
+      const receipt = await tx.wait();
+      return receipt.logs
+        .map((log) => pot.interface.parseLog(log))
+        .filter((event) => event !== null && event.name === "ProbeSkipped")
+        .map((event) => [event.args.flowId, Number(event.args.id_x)]);
+    }
+
+    it("skips references of unregistered flows and of flows of another controller", async function () {
+      const { pot, controller, flow, otherFlow, unregistered } = await loadFixture(deployFixture);
+      const args = [[flow, unregistered, otherFlow, flow], [1, 2, 3, 4], [SIG, SIG, SIG, SIG]];
+
+      expect(await pot.connect(controller).setFlowProbeHashes.staticCall(...args)).to.equal(2);
+      const tx = await pot.connect(controller).setFlowProbeHashes(...args);
+      expect(await skippedOf(pot, tx)).to.deep.equal([[unregistered, 2], [otherFlow, 3]]);
+    });
+
+    it("logs the probes of the batch that are not skipped", async function () {
+      const { pot, controller, egress, flow, unregistered } = await loadFixture(deployFixture);
+      await pot.connect(controller).setFlowProbeHashes([flow, flow], [1, 2], [SIG, SIG]);
+
+      const args = [[flow, unregistered, flow, flow], [1, 1, 2, 3], [SIG, SIG, "0x00000000", SIG]];
+      expect(await pot.connect(egress).logFlowProbeHashes.staticCall(...args)).to.equal(1);
+      const tx = await pot.connect(egress).logFlowProbeHashes(...args);
+      expect(await skippedOf(pot, tx)).to.deep.equal([[unregistered, 1]]);
+
+      const [success, fail, nil, routeId] = await pot.getFlowCompliance(flow);
+      expect([success, fail, nil, routeId]).to.deep.equal([1n, 1n, 1n, "1234"]);
+    });
+
+    it("skips every probe logged by an account that is not the egress edge", async function () {
+      const { pot, controller, flow } = await loadFixture(deployFixture);
+
+      const tx = await pot.connect(controller).logFlowProbeHashes([flow, flow], [1, 2], [SIG, SIG]);
+      expect(await skippedOf(pot, tx)).to.deep.equal([[flow, 1], [flow, 2]]);
+
+      const [success, fail, nil] = await pot.getFlowCompliance(flow);
+      expect([success, fail, nil]).to.deep.equal([0n, 0n, 0n]);
+    });
+
+    it("still reverts on arrays of different lengths", async function () {
+      const { pot, controller, flow } = await loadFixture(deployFixture);
+
+      await expect(pot.connect(controller).setFlowProbeHashes([flow, flow], [1], [SIG, SIG])).to.be.revertedWith(
+        "Batch arrays must have the same length"
+      );
+    });
+  });
+}
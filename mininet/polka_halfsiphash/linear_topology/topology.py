@@ -9,7 +9,9 @@ from mininet.log import info
 from mn_wifi.net import Mininet  # type: ignore assumes import exists, it's from p4-utils
 from mn_wifi.bmv2 import P4Switch  # type: ignore assumes import exists, it's from p4-utils
 
-N_SWITCHES = 10
+from .nodes import LINEAR_TOPOLOGY
+
+N_SWITCHES = len(LINEAR_TOPOLOGY)
 LINK_SPEED = 10
 
 CORE_THRIFT_CORE_OFFSET = 50000
@@ -87,14 +89,8 @@ def linear_topology(start=True) -> Mininet:
             net.addLink(hosts[i], edges[i], bw=LINK_SPEED)
             net.addLink(edges[i], cores[i], bw=LINK_SPEED)
 
-        last_switch = None
-
-        for i in range(0, N_SWITCHES):
-            switch = cores[i]
-
-            if last_switch:
-                net.addLink(last_switch, switch, bw=LINK_SPEED)
-            last_switch = switch
+        # Same ports Mininet would give in order: s(i-1) on port 2, s(i+1) on port 3
+        LINEAR_TOPOLOGY.add_core_links(net, {switch.name: switch for switch in cores}, bw=LINK_SPEED)
 
         # host 11
         # net.addLink(hosts[-1], edges[0], bw=LINK_SPEED)
@@ -1,12 +1,57 @@
-from urllib import request, error
 import json
+from os import environ as Environ
+from time import monotonic, sleep
 
-from .scenarios import Polka, PolkaProbe
-from .utils import calc_digests, get_ingress_edge, calc_flow_id, hash_flow_id
+from .http_pool import ConnectionPool
+from .probe_parser import ProbeFields
+from .submit_queue import SubmissionQueue
+from .utils import calc_digests, probe_flow_id, hash_flow_id
 
 ENDPOINT_URL = "http://localhost:5000/"
 EDGE_NODE_ADDRESS = "0xf17f52151EbEF6C7334FAD080c5704D77216b732"
 
+# Keep-alive connections to the API, shared by every helper below
+api = ConnectionPool(
+    ENDPOINT_URL,
+    size=int(Environ.get("API_POOL_SIZE", 8)),
+    timeout=float(Environ.get("API_TIMEOUT", 30)),
+)
+
+# How long to wait for a transaction to be mined, polling `GET tx/<hash>`
+TX_TIMEOUT = float(Environ.get("API_TX_TIMEOUT", 120))
+TX_POLL_INTERVAL = float(Environ.get("API_TX_POLL_INTERVAL", 0.5))
+
+def wait_for_tx(tx_hash: str, timeout: float = TX_TIMEOUT) -> dict:
+    """Waits until the API sees `tx_hash` mined (or dropped). Returns its last status, "pending" if it timed out"""
+    deadline = monotonic() + timeout
+    while True:
+        status, body = api.request("GET", f"tx/{tx_hash}")
+        if status != 200:
+            # 404: the API did not send it, or forgot it already
+            return {"txHash": tx_hash, "status": f"unknown ({status})"}
+        result = json.loads(body.decode('utf-8'))
+        if result["status"] != "pending" or monotonic() >= deadline:
+            return result
+        sleep(TX_POLL_INTERVAL)
+
+def _wait_mined(tx_hash: str) -> bool:
+    result = wait_for_tx(tx_hash)
+    if result["status"] == "success":
+        return True
+    print(f"Erro: transaction {tx_hash} {result['status']}")
+    return False
+
+# Last transaction that carried probes of each flow, per signing account (so per path):
+# the transactions of an account are mined in nonce order, so once it is mined the earlier ones are too
+_flow_txs = {}
+
+def _track_flow_tx(path: str, data: dict, tx_hash: str):
+    _flow_txs.setdefault(data.get("flowId"), {})[path] = tx_hash
+
+def wait_for_flow(flowId) -> bool:
+    """Waits until the probes posted so far for `flowId` are on-chain. Call `submissions.join()` first"""
+    return all([_wait_mined(tx_hash) for tx_hash in _flow_txs.pop(str(flowId), {}).values()])
+
 def call_deploy_flow_contract(flowId, routeId):
     print(f"\n*** Deploying the contract related to the flowId {flowId}")
 
@@ -16,16 +61,16 @@ def call_deploy_flow_contract(flowId, routeId):
         "edgeAddr": EDGE_NODE_ADDRESS
     }
 
-    req = request.Request(
-        ENDPOINT_URL + "deployFlowContract",
-        data = json.dumps(data_dct).encode('utf-8'),
-        headers={'Content-Type': 'application/json'}
-    )
-    res = request.urlopen(req)
+    status, body = api.request("POST", "deployFlowContract", data_dct)
 
-    if(res.status == 201):
-        print("Successfully deployed!")
-        print("Transaction hash: " + res.read().decode('utf-8').strip(), end="\n\n")
+    if(status == 201):
+        # The API answers once the transaction is sent: wait until it is mined
+        tx_hash = json.loads(body.decode('utf-8'))
+        print("Transaction hash: " + tx_hash)
+        if _wait_mined(tx_hash):
+            print("Successfully deployed!", end="\n\n")
+    elif(status == 500):
+        print("Erro: " + body.decode('utf-8'))
 
 def call_set_new_route(flowId, routeId):
     print(f"\n*** Setting new route to the flowId {flowId}")
@@ -36,151 +81,161 @@ def call_set_new_route(flowId, routeId):
         "newEdgeAddr": EDGE_NODE_ADDRESS
     }
 
-    req = request.Request(
-        ENDPOINT_URL + "setRouteId",
-        data = json.dumps(data_dct).encode('utf-8'),
-        headers={'Content-Type': 'application/json'}
-    )
-    res = request.urlopen(req)
-
-    if(res.status == 201):
-        print("Successfully deployed!")
-        print("Transaction hash: " + res.read().decode('utf-8').strip(), end="\n\n")
-
-def call_set_ref_sig(pkt):
-    polka_pkt = pkt.getlayer(Polka)
-    assert polka_pkt is not None, "❌ Polka layer not found"
-    probe_pkt = pkt.getlayer(PolkaProbe)
-    assert probe_pkt is not None, "❌ Probe layer not found"
-
-    ingress_edge = get_ingress_edge(pkt)
-    flow_id = calc_flow_id(pkt)
-    route_id = polka_pkt.route_id
-    timestamp = probe_pkt.timestamp
-    light_mult_sig = f"0x{calc_digests(route_id, ingress_edge, timestamp)[-1].hex()}"
+    status, body = api.request("POST", "setRouteId", data_dct)
 
-    data_dct = {
-        "flowId": str(flow_id),
-        "routeId": str(route_id),
-        "timestamp": str(hex(timestamp)),
+    if(status == 201):
+        # The API answers once the transaction is sent: wait until it is mined
+        tx_hash = json.loads(body.decode('utf-8'))
+        print("Transaction hash: " + tx_hash)
+        if _wait_mined(tx_hash):
+            print("Successfully deployed!", end="\n\n")
+    elif(status == 500):
+        print("Erro: " + body.decode('utf-8'))
+
+def ref_sig_payload(probe: ProbeFields, ingress_edge: str) -> dict:
+    light_mult_sig = f"0x{calc_digests(probe.route_id, ingress_edge, probe.timestamp)[-1].hex()}"
+
+    return {
+        "flowId": str(probe_flow_id(probe)),
+        "routeId": str(probe.route_id),
+        "timestamp": str(hex(probe.timestamp)),
         "lightMultSig": str(light_mult_sig),
     }
 
-    req = request.Request(
-        ENDPOINT_URL + "setRefSig",
-        data = json.dumps(data_dct).encode('utf-8'),
-        headers={'Content-Type': 'application/json'}
-    )
-
-    try:
-        res = request.urlopen(req)
-    #    ip_pkt = pkt.getlayer("IP")
-    #    assert ip_pkt is not None, "❌ IP layer not found"
-    #    ip_src = ip_pkt.src
-    #    ip_dst = ip_pkt.dst
-    #    print(f"\n*** Registering reference signature in flow ({ip_src} -> {ip_dst}): " + flow_id)
-    #    print("Reference Signature: "  + data_dct["lightMultSig"])
-    #    print("Transaction hash: " + res.read().decode('utf-8').strip(), end="\n\n")
-    except error.HTTPError as e:
-        if e.code == 500:
-            print("\n*** Registering reference signature in flow " + flow_id)
-            print("Erro: " + e.read().decode('utf-8'))        
-    
-
-def call_log_probe(pkt):
-    polka_pkt = pkt.getlayer(Polka)
-    assert polka_pkt is not None, "❌ Polka layer not found"
-    probe_pkt = pkt.getlayer(PolkaProbe)
-    assert probe_pkt is not None, "❌ Probe layer not found"
-
-    flow_id = calc_flow_id(pkt)
-    route_id = polka_pkt.route_id
-    timestamp = probe_pkt.timestamp
-    light_mult_sig = f"{probe_pkt.l_hash:#010x}"
+def log_probe_payload(probe: ProbeFields) -> dict:
+    light_mult_sig = f"{probe.l_hash:#010x}"
 
-    data_dct = {
-        "flowId": str(flow_id),
-        "routeId": str(route_id),
-        "timestamp": str(hex(timestamp)),
-        "lightMultSig": str(light_mult_sig),   
+    return {
+        "flowId": str(probe_flow_id(probe)),
+        "routeId": str(probe.route_id),
+        "timestamp": str(hex(probe.timestamp)),
+        "lightMultSig": str(light_mult_sig),
     }
 
-    req = request.Request(
-        ENDPOINT_URL + "logProbe",
-        data = json.dumps(data_dct).encode('utf-8'),
-        headers={'Content-Type': 'application/json'}
-    )
-
-    try:
-        res = request.urlopen(req)
-    #    ip_pkt = pkt.getlayer("IP")
-    #    assert ip_pkt is not None, "❌ IP layer not found"
-    #    ip_src = ip_pkt.src
-    #    ip_dst = ip_pkt.dst
-    #    print(f"\n*** Logging probe signature in flow ({ip_src} -> {ip_dst}): " + flow_id)
-    #    print("Probe Signature: " + data_dct["lightMultSig"])
-    #    print("Transaction hash: " + res.read().decode('utf8').strip(), end="\n\n")
-    except error.HTTPError as e:
-        if e.code == 500:
-            print("\n*** Logging probe signature in flow " + flow_id)
-            print("Erro: " + e.read().decode('utf-8'))
+_POST_ERRORS = {
+    "setRefSig": "\n*** Registering reference signature in flow ",
+    "logProbe": "\n*** Logging probe signature in flow ",
+}
+
+def post_json(path: str, data: dict):
+    """POSTs `data` to the API, returns `(status, body)`. Errors 500 are printed, as the contract reverts end there"""
+    status, body = api.request("POST", path, data)
+
+    if status == 200 and path in _BATCH_PATHS:
+        _track_flow_tx(path, data, json.loads(body.decode('utf-8')))
+    if status == 500:
+        print(_POST_ERRORS.get(path, f"\n*** {path} of flow ") + str(data.get("flowId")))
+        print("Erro: " + body.decode('utf-8'))
+    return status, body
+
+def post_json_batch(path: str, items: list, single_path: str = None):
+    """POSTs `items` as one JSON array to a batch endpoint. Returns the per-item results of the API, in order.
+    Invalid items come back with their own error, only those are printed.
+    If the whole batch is rejected (400, nothing was sent), its items are posted one by one to `single_path`."""
+    status, body = api.request("POST", path, items)
+
+    if status == 400 and single_path is not None:
+        print(f"\n*** {path}: batch of {len(items)} rejected, posting its items one by one")
+        results = []
+        for item in items:
+            item_status, item_body = post_json(single_path, item)
+            if item_status == 200:
+                results.append({"txHash": json.loads(item_body.decode('utf-8'))})
+                continue
+            if item_status != 500:
+                # 500 was already printed by `post_json`
+                print(_POST_ERRORS.get(single_path, f"\n*** {single_path} of flow ") + str(item.get("flowId")))
+                print("Erro: " + item_body.decode('utf-8'))
+            results.append({"error": item_body.decode('utf-8')})
+        return results
+    if status != 200:
+        print(f"\n*** {path}: batch of {len(items)} rejected ({status})")
+        print("Erro: " + body.decode('utf-8'))
+        return [{"error": f"Batch rejected ({status})"} for _ in items]
+
+    results = json.loads(body.decode('utf-8'))
+    for item, result in zip(items, results):
+        if "txHash" in result:
+            _track_flow_tx(single_path or path, item, result["txHash"])
+        elif "error" in result:
+            print(_POST_ERRORS.get(path[:-1], f"\n*** {path} of flow ") + str(item.get("flowId")))
+            print("Erro: " + result["error"])
+    return results
+
+# Batch endpoints of the single ones, in the order they are posted: a reference signature
+# has to reach the contract before the egress probe it checks
+_BATCH_PATHS = {
+    "setRefSig": "setRefSigs",
+    "logProbe": "logProbes",
+}
+
+def post_batch(batch: list):
+    """Posts `(path, data)` pairs with one request per batch endpoint. Other paths are posted one by one."""
+    groups = {path: [] for path in _BATCH_PATHS}
+    for path, data in batch:
+        if path in groups:
+            groups[path].append(data)
+        else:
+            post_json(path, data)
+
+    for path, items in groups.items():
+        if len(items) == 1:
+            post_json(path, items[0])
+        elif items:
+            post_json_batch(_BATCH_PATHS[path], items, path)
+
+def call_set_ref_sig(probe: ProbeFields, ingress_edge: str):
+    post_json("setRefSig", ref_sig_payload(probe, ingress_edge))
+
+def call_log_probe(probe: ProbeFields):
+    post_json("logProbe", log_probe_payload(probe))
+
+# Between the sniffer and the API, see `SubmissionQueue.from_env` for its settings
+submissions = SubmissionQueue.from_env(post_json, post_batch)
+
+def submit_set_ref_sig(probe: ProbeFields, ingress_edge: str):
+    """Same as `call_set_ref_sig`, posted by the submission workers. Returns at once."""
+    submissions.submit(probe_flow_id(probe), "setRefSig", ref_sig_payload, probe, ingress_edge)
+
+def submit_log_probe(probe: ProbeFields):
+    """Same as `call_log_probe`, posted by the submission workers. Returns at once."""
+    submissions.submit(probe_flow_id(probe), "logProbe", log_probe_payload, probe)
 
 def call_get_flow_compliance(flowId):
-    req = request.Request(
-        ENDPOINT_URL + f"getFlowCompliance/{flowId}",
-        headers={'Content-Type': 'application/json'}
-    )
-
-    try:
-        res = request.urlopen(req)
-        data = json.loads(res.read().decode('utf8'))
+    status, body = api.request("GET", f"getFlowCompliance/{flowId}")
+
+    if status == 200:
+        data = json.loads(body.decode('utf8'))
         print("\n*** Getting flow compliance of current route")
         print("FlowId: " + flowId)
         print("RouteId: " + data[1])
         print(f"Probe Success: {data[0]['success']}")
         print(f"Probe Fail: {data[0]['fail']}")
         print(f"Probe Null: {data[0]['nil']}\n\n")
-    except error.HTTPError as e:
-        if e.code == 500:
-            print("\n*** Getting compliance of flow " + flowId)
-            print("Erro: " + e.read().decode('utf-8'))
+    elif status == 500:
+        print("\n*** Getting compliance of flow " + flowId)
+        print("Erro: " + body.decode('utf-8'))
 
 def call_get_flow_compliance_consolidation(flowId):
+    # The whole route history in one request, instead of one per route
+    status, body = api.request("GET", f"getFlowComplianceHistory/{flowId}")
+
     size = 0
-    
-    req = request.Request(
-        ENDPOINT_URL + f"getFlowSizeRoutesHistory/{flowId}",
-        headers={'Content-Type': 'application/json'}
-    )
-
-    try:
-        res = request.urlopen(req)
-        data = json.loads(res.read().decode('utf8'))
-        size = int(data[0])
-
-    except error.HTTPError as e:
-        if e.code == 500:
-            print("\n*** Getting history of flow " + flowId)
-            print("Erro: " + e.read().decode('utf-8'))
-        
+    history = []
+    if status == 200:
+        data = json.loads(body.decode('utf8'))
+        size = data["size"]
+        history = data["history"]
+    elif status == 500:
+        print("\n*** Getting history of flow " + flowId)
+        print("Erro: " + body.decode('utf-8'))
+
     print("\n*** Getting flow compliance consolidation")
     print("FlowId: " + flowId)
     print(f"Qtt of routes in history: {size}")
-    
-    for i in range(0, size):
-        req = request.Request(
-            ENDPOINT_URL + f"/getFlowComplianceOfRouteHistoryIndex/{flowId}/{i}",
-            headers={'Content-Type': 'application/json'}
-        )
-
-        try:
-            res = request.urlopen(req)
-            data = json.loads(res.read().decode('utf8'))
-            print("RouteId: " + data[1])
-            print(f"Probe Success: {data[0]['success']}")
-            print(f"Probe Fail: {data[0]['fail']}")
-            print(f"Probe Null: {data[0]['nil']}\n\n")
-        
-        except error.HTTPError as e:
-            if e.code == 500:
-                print(f"Erro(routeId[{i}]): " + e.read().decode('utf-8'))
+
+    for compliance, routeId in history:
+        print("RouteId: " + routeId)
+        print(f"Probe Success: {compliance['success']}")
+        print(f"Probe Fail: {compliance['fail']}")
+        print(f"Probe Null: {compliance['nil']}\n\n")
@@ -0,0 +1,38 @@
+"""
+Scapy layers of the PolKA headers. Kept apart from `scapy.py` so they can be used without Mininet
+"""
+
+from scapy.all import bind_layers, Packet, BitField
+from scapy.layers.l2 import Ether
+from scapy.layers.inet import IP
+
+POLKA_PROTO = 0x1234
+PROBE_VERSION = 0xF1
+
+
+# order matters. It is the order in the packet header
+class Polka(Packet):
+    fields_desc = [
+        BitField("version", default=0, size=8),
+        BitField("ttl", default=0, size=8),
+        BitField("proto", default=0, size=16),
+        BitField("route_id", default=0, size=160),
+    ]
+
+
+class PolkaProbe(Packet):
+    fields_desc = [
+        BitField("timestamp", default=0, size=32),
+        BitField("l_hash", default=0, size=32),
+    ]
+
+    def to_dict(self):
+        return {
+            "timestamp": self.timestamp,
+            "l_hash": self.l_hash,
+        }
+
+
+bind_layers(Ether, Polka, type=POLKA_PROTO)
+bind_layers(Polka, PolkaProbe, version=PROBE_VERSION)
+bind_layers(PolkaProbe, IP)
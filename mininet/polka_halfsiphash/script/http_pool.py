@@ -0,0 +1,93 @@
+"""
+Keep-alive HTTP connections to the API, shared by the `call_*` helpers and the submission workers.
+"""
+
+import http.client
+import json
+import queue
+import select
+import socket
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+# Raised when a kept-alive connection was closed by the server meanwhile: worth one retry on a new one.
+# Once the request was sent, the server may have handled it already, so only methods safe to repeat are retried then
+_STALE_SEND = (BrokenPipeError, ConnectionResetError)
+_STALE_RESPONSE = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError)
+_IDEMPOTENT = ("GET", "HEAD", "OPTIONS")
+
+
+class ConnectionPool:
+    def __init__(self, url: str, size: int = 8, timeout: Optional[float] = 10.0):
+        """Up to `size` idle connections to the host of `url` are kept open. More can be open at once
+        (one per concurrent request); the extra ones are closed once done."""
+        parts = urlsplit(url)
+        assert parts.scheme == "http", f"❌ Only http is supported, got {url}"
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize=size)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        conn.connect()
+        # Requests are small, don't let Nagle hold them back
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def _get(self) -> Tuple[http.client.HTTPConnection, bool]:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect(), False
+            # An idle connection has nothing to read, unless the server closed it
+            if conn.sock is not None and not select.select([conn.sock], [], [], 0)[0]:
+                return conn, True
+            conn.close()
+
+    def _put(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method: str, path: str, data=None) -> Tuple[int, bytes]:
+        """Sends `data` as JSON (if given) to `path`. Returns the status and the body of the response."""
+        body = None
+        headers = {"Content-Type": "application/json"}
+        if data is not None:
+            body = data if isinstance(data, bytes) else json.dumps(data).encode("utf-8")
+
+        url = f"{self.base_path}/{path.lstrip('/')}"
+        conn, reused = self._get()
+        while True:
+            sent = False
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                sent = True
+                res = conn.getresponse()
+                payload = res.read()
+                break
+            except (_STALE_RESPONSE if sent else _STALE_SEND):
+                conn.close()
+                if not reused or (sent and method.upper() not in _IDEMPOTENT):
+                    raise
+                conn, reused = self._connect(), False
+            except Exception:
+                conn.close()
+                raise
+
+        if res.will_close:
+            conn.close()
+        else:
+            self._put(conn)
+        return res.status, payload
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
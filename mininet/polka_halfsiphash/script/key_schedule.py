@@ -0,0 +1,27 @@
+"""
+Per-hop SipHash keys, laid out as in the p4 code: node_id (16b) ++ exit_port (9b) ++ seed (32b) ++ 0 (7b)
+"""
+
+from functools import lru_cache
+from typing import Tuple
+
+KEY_BASE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=KEY_BASE_CACHE_SIZE)
+def hop_key_base(node_id: int, exit_port: int) -> int:
+    """Returns the part of k0 that does not depend on the seed. Cached per (node_id, exit_port), in an LRU cache."""
+    return ((node_id & 0xFFFF) << 16) | ((exit_port & 0x1FF) << 7)
+
+
+def hop_key_words(node_id: int, exit_port: int, seed: int) -> Tuple[int, int]:
+    """Returns the (k0, k1) words of the key used on a hop. The 7 high bits of the seed end k0, its 25 low bits start k1."""
+    k0 = hop_key_base(node_id, exit_port) | ((seed >> 25) & 0x7F)
+    k1 = (seed << 7) & 0xFFFF_FFFF
+    return k0, k1
+
+
+def hop_key(node_id: int, exit_port: int, seed: int) -> bytes:
+    """Returns the 64-bit key used on a hop, as `siphash` expects it"""
+    k0, k1 = hop_key_words(node_id, exit_port, seed)
+    return ((k0 << 32) | k1).to_bytes(8, byteorder="big")
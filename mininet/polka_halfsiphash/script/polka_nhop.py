@@ -1,8 +1,8 @@
 """Simulates PolKA behavior"""
 
-from math import ceil
+from typing import Iterable, Optional, Tuple
 
-from crc import Configuration, Calculator
+import numpy as np
 
 
 def bitmask(n: int) -> int:
@@ -12,7 +12,26 @@ def bitmask(n: int) -> int:
     return (1 << n) - 1
 
 
-def crc_for_node(node_id: int) -> Calculator:
+def crc16_table(polynomial: int) -> Tuple[int, ...]:
+    """Returns the 256-entry lookup table of a CRC16 (MSB first, no reflection) for `polynomial`"""
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = (crc << 1) ^ polynomial if crc & 0x8000 else crc << 1
+        table.append(crc & bitmask(16))
+    return tuple(table)
+
+
+def crc16_table_slice2(table: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Returns the table for the high byte of a 16-bit word, so a whole word is consumed per step (slice-by-2)"""
+    return tuple(((entry << 8) & bitmask(16)) ^ table[entry >> 8] for entry in table)
+
+
+def crc_for_node(node_id: int):
+    """Generic `crc` package calculator with the same configuration as `Node.nhop`. Only used for cross-checking."""
+    from crc import Configuration, Calculator
+
     cfg = Configuration(
         width=16,
         init_value=0,
@@ -25,15 +44,16 @@ def crc_for_node(node_id: int) -> Calculator:
 
 
 class Node:
-    def __init__(self, name: str, node_id: int, ports: list = []):
+    def __init__(self, name: str, node_id: int, ports: Optional[list] = None):
         """Initializes a node with a name and node_id.
         `ports` is a list with index equal to source port number, and value equal to a weak reference to the node it is connected to (destination port not needed)."""
 
         assert node_id is not None, "node_id is required"
         self.name = name
         self.node_id = node_id
-        self.crc = crc_for_node(self.node_id)
-        self.ports = ports
+        self.crc_table = crc16_table(self.node_id)
+        self.crc_table_hi = crc16_table_slice2(self.crc_table)
+        self.ports = ports if ports is not None else []
 
     def nhop(self, route_id: int) -> int:
         """Returns the next hop (port) for a given route_id."""
@@ -44,11 +64,58 @@ class Node:
         # Max value allowed. Only used in p4 code
         # ncount = (4294967296 * 2) & bitmask(64)
 
-        nresult = self.crc.checksum(
-            ndata.to_bytes(length=ceil(160 / 8), byteorder="big")
-        )
+        # CRC16 of the 20 bytes of ndata (big endian), init 0 and no final xor.
+        # Same as `crc_for_node(node_id).checksum(...)`, one 16-bit word at a time
+        table_lo = self.crc_table
+        table_hi = self.crc_table_hi
+        nresult = 0
+        for shift in range(160 - 16, -1, -16):
+            x = nresult ^ ((ndata >> shift) & 0xFFFF)
+            nresult = table_hi[x >> 8] ^ table_lo[x & 0xFF]
+
         return (nresult ^ dif) & bitmask(9)
 
     def __repr__(self):
         return f"Switch({self.name})"
 
+
+def _route_words(route_id: int) -> Tuple[Tuple[int, ...], int]:
+    """Splits a route_id into the 16-bit words of ndata (most significant first) and `dif`, as `Node.nhop` does"""
+    ndata = (route_id >> 16) & bitmask(160)
+    dif = (route_id ^ ((ndata << 16) & bitmask(160))) & bitmask(16)
+    words = tuple((ndata >> shift) & 0xFFFF for shift in range(160 - 16, -1, -16))
+    return words, dif
+
+
+class NodeGroup:
+    def __init__(self, nodes: Iterable[Node]):
+        """Groups nodes to evaluate route_ids against all of them at once.
+        The CRC tables of every node are stacked, and looked up with an offset of 256 per node."""
+
+        self.nodes = list(nodes)
+        self.crc_tables = np.array([n.crc_table for n in self.nodes], dtype=np.uint16).ravel()
+        self.crc_tables_hi = np.array([n.crc_table_hi for n in self.nodes], dtype=np.uint16).ravel()
+        self._offsets = np.arange(len(self.nodes), dtype=np.intp) * 256
+
+    def nhop(self, route_id: int) -> np.ndarray:
+        """Returns the next hop (port) for `route_id` on every node, in the same order as `nodes`."""
+        return self.nhop_many([route_id])[0]
+
+    def nhop_many(self, route_ids: Iterable[int]) -> np.ndarray:
+        """Returns a (len(route_ids), len(nodes)) array with the next hop of each route_id on each node."""
+        split = [_route_words(route_id) for route_id in route_ids]
+        words = np.array([w for w, _ in split], dtype=np.uint16).reshape(len(split), 160 // 16)
+        dif = np.array([d for _, d in split], dtype=np.uint16)[:, None]
+
+        nresult = np.zeros((len(split), len(self.nodes)), dtype=np.uint16)
+        for i in range(words.shape[1]):
+            x = nresult ^ words[:, i, None]
+            nresult = self.crc_tables_hi[self._offsets + (x >> 8)] ^ self.crc_tables[self._offsets + (x & 0xFF)]
+
+        return (nresult ^ dif) & bitmask(9)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return f"NodeGroup({self.nodes!r})"
@@ -0,0 +1,126 @@
+"""Computes PolKA route_ids. Polynomials over GF(2) are represented as ints, bit `i` being the coefficient of x^i"""
+
+from typing import Iterator, List, Sequence, Tuple
+
+from .polka_nhop import Node, bitmask
+
+# `Node.nhop` only keeps 160 bits of ndata, above the 16 bits of `dif`
+MAX_ROUTE_BITS = 160 + 16
+
+
+def gf2_mul(a: int, b: int) -> int:
+    """Carry-less product of `a` and `b`"""
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        a <<= 1
+        b >>= 1
+    return result
+
+
+def gf2_divmod(a: int, b: int) -> Tuple[int, int]:
+    """Polynomial long division of `a` by `b`. Returns (quotient, remainder)"""
+    if b == 0:
+        raise ZeroDivisionError("GF(2) polynomial division by zero")
+    quotient = 0
+    b_degree = b.bit_length()
+    while a.bit_length() >= b_degree:
+        shift = a.bit_length() - b_degree
+        quotient |= 1 << shift
+        a ^= b << shift
+    return quotient, a
+
+
+def gf2_mod(a: int, b: int) -> int:
+    return gf2_divmod(a, b)[1]
+
+
+def gf2_inverse(a: int, modulus: int) -> int:
+    """Inverse of `a` modulo `modulus` (extended Euclid). Raises `ValueError` if they are not coprime"""
+    r0, r1 = modulus, gf2_mod(a, modulus)
+    s0, s1 = 0, 1
+    while r1:
+        q, r = gf2_divmod(r0, r1)
+        r0, r1 = r1, r
+        s0, s1 = s1, s0 ^ gf2_mul(q, s1)
+    if r0 != 1:
+        raise ValueError(f"{a:#x} has no inverse modulo {modulus:#x}")
+    return gf2_mod(s0, modulus)
+
+
+def gf2_gcd(a: int, b: int) -> int:
+    while b:
+        a, b = b, gf2_mod(a, b)
+    return a
+
+
+def _x_pow_2k(k: int, modulus: int) -> int:
+    """x^(2^k) mod `modulus`, by squaring x `k` times"""
+    result = gf2_mod(0b10, modulus)
+    for _ in range(k):
+        result = gf2_mod(gf2_mul(result, result), modulus)
+    return result
+
+
+def is_irreducible(polynomial: int) -> bool:
+    """Rabin's test: a degree-n polynomial p is irreducible iff x^(2^n) = x mod p
+    and gcd(x^(2^(n/q)) - x, p) = 1 for every prime q dividing n"""
+    degree = polynomial.bit_length() - 1
+    if degree < 1:
+        return False
+    if _x_pow_2k(degree, polynomial) != gf2_mod(0b10, polynomial):
+        return False
+    primes = [q for q in range(2, degree + 1) if degree % q == 0 and all(q % d for d in range(2, q))]
+    return all(gf2_gcd(_x_pow_2k(degree // q, polynomial) ^ 0b10, polynomial) == 1 for q in primes)
+
+
+def irreducible_node_ids(degree: int = 16) -> Iterator[int]:
+    """Yields, in ascending order, the node_ids (polynomial without the leading term) of the irreducible
+    polynomials of `degree`. For degree 16 it starts with the ids of the linear topology: 0x2B, 0x2D, 0x39..."""
+    for node_id in range(1, 1 << degree, 2):
+        if is_irreducible((1 << degree) | node_id):
+            yield node_id
+
+
+def node_polynomial(node: Node) -> int:
+    """The full degree-16 polynomial of a node. `node_id` omits the x^16 term, as the CRC configuration does"""
+    return (1 << 16) | node.node_id
+
+
+def compile_route(path: Sequence[Tuple[Node, int]]) -> int:
+    """Returns the route_id that makes each node of `path` forward through its port.
+
+    `path` is a list of `(node, exit_port)`, the last one usually being an edge port (0 or 1).
+    The route_id is the CRT solution of `route_id mod node_polynomial(node) == exit_port` for every hop,
+    which is what `Node.nhop` evaluates (the CRC of ndata plus `dif` is `route_id mod polynomial`).
+    """
+    polynomials = [node_polynomial(node) for node, _ in path]
+
+    modulus = 1
+    for polynomial in polynomials:
+        modulus = gf2_mul(modulus, polynomial)
+
+    route_id = 0
+    for polynomial, (node, exit_port) in zip(polynomials, path):
+        assert 0 <= exit_port <= bitmask(9), f"Invalid exit port {exit_port} on {node!r}"
+        others, _ = gf2_divmod(modulus, polynomial)
+        try:
+            inverse = gf2_inverse(others, polynomial)
+        except ValueError:
+            raise ValueError(f"Node polynomial of {node!r} is not coprime with the rest of the path")
+        route_id ^= gf2_mul(gf2_mul(exit_port, others), inverse)
+
+    route_id = gf2_mod(route_id, modulus)
+
+    if route_id.bit_length() > MAX_ROUTE_BITS:
+        raise ValueError(f"Path too long: route_id needs {route_id.bit_length()} bits (max {MAX_ROUTE_BITS})")
+    for node, exit_port in path:
+        if node.nhop(route_id) != exit_port:
+            raise ValueError(f"route_id {route_id} does not round-trip on {node!r}")
+
+    return route_id
+
+
+def compile_routes(paths: Sequence[Sequence[Tuple[Node, int]]]) -> List[int]:
+    return [compile_route(path) for path in paths]
@@ -0,0 +1,75 @@
+"""
+Reads the fields of PolKA probes straight from the raw frame bytes, without Scapy dissection.
+Layout: Ethernet (14B) | Polka (24B) | PolkaProbe (8B) | IPv4 | TCP/UDP/ICMP
+"""
+
+import socket
+import struct
+from typing import NamedTuple, Optional, Union
+
+from .headers import POLKA_PROTO, PROBE_VERSION
+
+IP_PROTO_ICMP = 1
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+
+# Ether type | Polka version, ttl, proto, route_id | PolkaProbe timestamp, l_hash
+_POLKA = struct.Struct("!HBBH20sII")
+_POLKA_OFFSET = 12
+_IP_OFFSET = _POLKA_OFFSET + _POLKA.size
+# version/ihl | (tos, total length, id, flags/fragment, ttl) | proto | (checksum) | src | dst
+_IPV4 = struct.Struct("!B8xB2x4s4s")
+_PORTS = struct.Struct("!HH")
+
+
+class ProbeFields(NamedTuple):
+    ethertype: int
+    version: int
+    ttl: int
+    proto: int
+    route_id: int
+    timestamp: int
+    l_hash: int
+    ip_src: str
+    ip_dst: str
+    ip_proto: int
+    sport: int  # 0 if not TCP/UDP
+    dport: int  # 0 if not TCP/UDP
+    icmp_type: Optional[int]  # None if not ICMP
+
+
+def parse_probe(frame: Union[bytes, bytearray, memoryview]) -> Optional[ProbeFields]:
+    """Returns the fields of a probe frame, or `None` if `frame` is not a (complete) PolKA probe.
+    Reads in place with `struct.unpack_from`, so a `memoryview` over a capture buffer is not copied."""
+    if len(frame) < _IP_OFFSET + _IPV4.size:
+        return None
+
+    ethertype, version, ttl, proto, route_id, timestamp, l_hash = _POLKA.unpack_from(frame, _POLKA_OFFSET)
+    if ethertype != POLKA_PROTO or version != PROBE_VERSION:
+        return None
+
+    version_ihl, ip_proto, ip_src, ip_dst = _IPV4.unpack_from(frame, _IP_OFFSET)
+    l4_offset = _IP_OFFSET + (version_ihl & 0x0F) * 4
+
+    sport = dport = 0
+    icmp_type = None
+    if ip_proto in (IP_PROTO_TCP, IP_PROTO_UDP) and len(frame) >= l4_offset + _PORTS.size:
+        sport, dport = _PORTS.unpack_from(frame, l4_offset)
+    elif ip_proto == IP_PROTO_ICMP and len(frame) > l4_offset:
+        icmp_type = frame[l4_offset]
+
+    return ProbeFields(
+        ethertype,
+        version,
+        ttl,
+        proto,
+        int.from_bytes(route_id, byteorder="big"),
+        timestamp,
+        l_hash,
+        socket.inet_ntoa(ip_src),
+        socket.inet_ntoa(ip_dst),
+        ip_proto,
+        sport,
+        dport,
+        icmp_type,
+    )
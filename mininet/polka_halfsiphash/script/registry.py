@@ -0,0 +1,37 @@
+"""
+Known topologies and the route_ids of their flows, indexed once at import to resolve route_ids in O(1)
+"""
+
+from typing import Dict, Iterable, Optional
+
+from .topology import Topology
+from ..linear_topology.nodes import LINEAR_TOPOLOGY
+from ..linear_topology.flows import flows as linear_flows
+from ..simple_topology.nodes import SIMPLE_TOPOLOGY
+from ..simple_topology.flows import flows as simple_flows
+
+LINEAR = LINEAR_TOPOLOGY
+SIMPLE = SIMPLE_TOPOLOGY
+
+# route_id -> owning topology
+_route_owners: Dict[int, Topology] = {}
+
+
+def register_routes(topology: Topology, route_ids: Iterable[int]):
+    """Declares `route_ids` as routes of `topology`. Later registrations win for route_ids valid on both."""
+    for route_id in route_ids:
+        _route_owners[route_id] = topology
+
+
+def _flow_route_ids(flows: dict) -> set:
+    return {route_id for flow in flows.values() for route_id in flow["routes"].values()}
+
+
+register_routes(LINEAR, _flow_route_ids(linear_flows))
+# Simple goes last, so it wins for route_ids that are also valid on the linear topology
+register_routes(SIMPLE, _flow_route_ids(simple_flows))
+
+
+def topology_of(route_id: int, default: Optional[Topology] = LINEAR) -> Optional[Topology]:
+    """Returns the topology `route_id` belongs to, or `default` if it is not a known route"""
+    return _route_owners.get(route_id, default)
@@ -0,0 +1,212 @@
+"""
+Probe capture through Linux AF_PACKET sockets with a memory-mapped TPACKET_V3 ring.
+
+The kernel fills whole blocks of frames, already filtered by a classic BPF program on the PolKA
+ethertype, and the frames of each block are handed to a callback in one call, without copies.
+"""
+
+import ctypes
+import mmap
+import select
+import socket
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .headers import POLKA_PROTO
+
+# <linux/if_packet.h>, <linux/filter.h>
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+ETH_P_ALL = 0x0003
+SO_ATTACH_FILTER = 26
+
+# struct tpacket_req3: block_size, block_nr, frame_size, frame_nr, retire_blk_tov, sizeof_priv, feature_req_word
+_TPACKET_REQ3 = struct.Struct("=7I")
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1: block_status, num_pkts, offset_to_first_pkt
+_BLOCK_DESC = struct.Struct("=5I")
+# struct tpacket3_hdr: tp_next_offset, tp_sec, tp_nsec, tp_snaplen, tp_len, tp_status, tp_mac, tp_net
+_PACKET_HDR = struct.Struct("=6IHH")
+_BLOCK_STATUS_OFFSET = 8
+# struct tpacket_stats_v3: tp_packets, tp_drops, tp_freeze_q_cnt
+_STATS_V3 = struct.Struct("=3I")
+# struct sock_filter: code, jt, jf, k
+_SOCK_FILTER = struct.Struct("=HBBI")
+
+# (frame, interface name). Frames are views on the ring, only valid during the callback: copy what must outlive it
+Frame = Tuple[memoryview, str]
+BatchCallback = Callable[[List[Frame]], None]
+
+
+def ethertype_filter(ethertype: int) -> bytes:
+    """Classic BPF program accepting only frames of `ethertype` (same as the filter "ether proto 0x1234")"""
+    program = [
+        (0x28, 0, 0, 12),  # ldh [12]
+        (0x15, 0, 1, ethertype),  # jeq #ethertype, accept, drop
+        (0x06, 0, 0, 0x0004_0000),  # ret #262144 (accept, whole frame)
+        (0x06, 0, 0, 0),  # ret #0 (drop)
+    ]
+    return b"".join(_SOCK_FILTER.pack(*instruction) for instruction in program)
+
+
+def _attach_filter(sock: socket.socket, program: bytes):
+    buffer = ctypes.create_string_buffer(program)
+    # struct sock_fprog: unsigned short len, struct sock_filter *filter (native alignment)
+    fprog = struct.pack("HP", len(program) // _SOCK_FILTER.size, ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+class _Ring:
+    def __init__(self, iface: str, block_size: int, block_nr: int, frame_size: int, block_timeout_ms: int, ethertype: int):
+        self.iface = iface
+        self.block_size = block_size
+        self.block_nr = block_nr
+        self.block = 0
+
+        # Protocol 0: nothing is queued until `bind`, so frames of other interfaces never reach the ring
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            _attach_filter(self.sock, ethertype_filter(ethertype))
+            self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            req = _TPACKET_REQ3.pack(
+                block_size, block_nr, frame_size, block_size // frame_size * block_nr, block_timeout_ms, 0, 0
+            )
+            self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self.map = mmap.mmap(self.sock.fileno(), block_size * block_nr, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            self.view = memoryview(self.map)
+            self.sock.bind((iface, ETH_P_ALL))
+        except Exception:
+            self.sock.close()
+            raise
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def drain(self, cb: BatchCallback) -> Tuple[int, int, int]:
+        """Hands every block the kernel has released to `cb`, then gives them back.
+        A failing `cb` is reported and the next blocks are still drained.
+        Returns the amount of (frames, blocks, blocks whose callback failed)"""
+        total = blocks = errors = 0
+        while True:
+            offset = self.block * self.block_size
+            _, _, status, num_pkts, first = _BLOCK_DESC.unpack_from(self.map, offset)
+            if not status & TP_STATUS_USER:
+                return total, blocks, errors
+
+            frames = []
+            pkt = offset + first
+            for _ in range(num_pkts):
+                next_offset, _, _, snaplen, _, _, mac, _ = _PACKET_HDR.unpack_from(self.map, pkt)
+                frames.append((self.view[pkt + mac : pkt + mac + snaplen], self.iface))
+                pkt += next_offset
+
+            try:
+                if frames:
+                    cb(frames)
+            except Exception as e:
+                errors += 1
+                print(f"*** Batch callback failed on {self.iface}: {e!r}")
+            finally:
+                for frame, _ in frames:
+                    frame.release()
+                struct.pack_into("=I", self.map, offset + _BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+                self.block = (self.block + 1) % self.block_nr
+            total += num_pkts
+            blocks += 1
+
+    def stats(self) -> Tuple[int, int, int]:
+        """(packets, drops, freeze_q_cnt) since the previous call. The kernel resets them on read"""
+        return _STATS_V3.unpack(self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _STATS_V3.size))
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+        self.sock.close()
+
+
+class RingSniffer:
+    def __init__(
+        self,
+        ifaces: Sequence[str],
+        batch_cb: BatchCallback,
+        block_size: int = 1 << 18,
+        block_nr: int = 16,
+        frame_size: int = 1 << 11,
+        block_timeout_ms: int = 10,
+        ethertype: int = POLKA_PROTO,
+    ):
+        """Captures `ethertype` frames on `ifaces` into one TPACKET_V3 ring per interface.
+
+        `batch_cb` gets the frames of each block (up to `block_size` bytes, or whatever arrived within
+        `block_timeout_ms`) as a list of `(frame, iface)`. `block_size` must be a multiple of the page size.
+        Each ring pins `block_size * block_nr` bytes of kernel memory (4 MiB by default).
+        Same `start`/`stop` interface as Scapy's `AsyncSniffer`.
+        """
+        self.ifaces = list(ifaces)
+        self.batch_cb = batch_cb
+        self._ring_args = (block_size, block_nr, frame_size, block_timeout_ms, ethertype)
+        self._rings: List[_Ring] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {"frames": 0, "blocks": 0, "errors": 0, "packets": 0, "drops": 0, "freeze_q_cnt": 0}
+
+    def start(self):
+        self._rings = [_Ring(iface, *self._ring_args) for iface in self.ifaces]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="RingSniffer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        poller = select.poll()
+        rings = {}
+        for ring in self._rings:
+            poller.register(ring.fileno(), select.POLLIN | select.POLLERR)
+            rings[ring.fileno()] = ring
+
+        try:
+            while not self._stop.is_set():
+                for fd, _ in poller.poll(100):
+                    self._count(*rings[fd].drain(self.batch_cb))
+
+            # Whatever is left on the rings
+            for ring in self._rings:
+                self._count(*ring.drain(self.batch_cb))
+        finally:
+            # Only this thread reads the rings, so it is also the one unmapping them
+            with self._lock:
+                self._read_stats()
+                for ring in self._rings:
+                    ring.close()
+                self._rings = []
+
+    def _count(self, frames: int, blocks: int, errors: int):
+        self.counters["frames"] += frames
+        self.counters["blocks"] += blocks
+        self.counters["errors"] += errors
+
+    def _read_stats(self):
+        for ring in self._rings:
+            packets, drops, freeze_q_cnt = ring.stats()
+            self.counters["packets"] += packets
+            self.counters["drops"] += drops
+            self.counters["freeze_q_cnt"] += freeze_q_cnt
+
+    def stats(self) -> Dict[str, int]:
+        """Frames and blocks handed to the callback (`errors` being blocks it failed on),
+        plus kernel counters (`drops` being frames lost to a full ring)"""
+        with self._lock:
+            self._read_stats()
+            return dict(self.counters)
+
+    def stop(self, join: bool = True):
+        """Stops capturing. The rings are closed by the capture thread once it is done with them;
+        with `join=False` this returns right away and `stats` is final only after that."""
+        self._stop.set()
+        if join and self._thread is not None:
+            self._thread.join()
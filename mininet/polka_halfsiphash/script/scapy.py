@@ -2,52 +2,49 @@
 For scapy setup and utilities
 """
 
+from os import environ as Environ
 from typing import Callable, Optional
 
 from time import sleep
 
 # https://scapy.readthedocs.io/en/stable/usage.html#sniffing
-from scapy.all import AsyncSniffer, bind_layers, Packet, BitField
-from scapy.layers.l2 import Ether
-from scapy.layers.inet import TCP, UDP, ICMP, IP
+from scapy.all import AsyncSniffer, Packet, conf
 from mn_wifi.net import Mininet, info  # type: ignore assumes import exists, it's from p4-utils
 
 from ..linear_topology.topology import all_ifaces
+from .headers import POLKA_PROTO, PROBE_VERSION, Polka, PolkaProbe
+from .ring_capture import BatchCallback, RingSniffer
 
-POLKA_PROTO = 0x1234
-PROBE_VERSION = 0xF1
+# "scapy" (AsyncSniffer, one callback per frame) or "ring" (TPACKET_V3 ring, one callback per block of frames)
+SNIFF_BACKEND = Environ.get("SNIFF_BACKEND", "scapy")
 
 
-# order matters. It is the order in the packet header
-class Polka(Packet):
-    fields_desc = [
-        BitField("version", default=0, size=8),
-        BitField("ttl", default=0, size=8),
-        BitField("proto", default=0, size=16),
-        BitField("route_id", default=0, size=160),
-    ]
+class RawL2ListenSocket(conf.L2listen):
+    """Listen socket that hands frames over as `Raw`, skipping Scapy's dissection of the PolKA headers.
+    Callbacks read the fields with `probe_parser.parse_probe(pkt.original)`."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.LL = conf.raw_layer
 
-class PolkaProbe(Packet):
-    fields_desc = [
-        BitField("timestamp", default=0, size=32),
-        BitField("l_hash", default=0, size=32),
-    ]
 
-    def to_dict(self):
-        return {
-            "timestamp": self.timestamp,
-            "l_hash": self.l_hash,
-        }
+def start_sniffing(
+    net: Mininet,
+    port,
+    ifaces_fn = all_ifaces,
+    cb: Optional[Callable[[Packet], Optional[str]]] = None,
+    batch_cb: Optional[BatchCallback] = None,
+    backend: str = SNIFF_BACKEND,
+):
+    """Sniffs the PolKA frames of `ifaces_fn(net, port)`.
+    With the "ring" backend and a `batch_cb`, frames come in blocks from a `RingSniffer` instead of `cb`."""
+    info(f"*** 👃 Sniffing on {ifaces_fn(net, port)} ({backend})\n")
 
-
-bind_layers(Ether, Polka, type=POLKA_PROTO)
-bind_layers(Polka, PolkaProbe, version=PROBE_VERSION)
-bind_layers(PolkaProbe, IP)
-
-
-def start_sniffing(net: Mininet, port, ifaces_fn = all_ifaces, cb: Optional[Callable[[Packet], Optional[str]]] = None):
-    info(f"*** 👃 Sniffing on {ifaces_fn(net, port)}\n")
+    if backend == "ring" and batch_cb is not None:
+        sniffer = RingSniffer(ifaces_fn(net, port), batch_cb, ethertype=POLKA_PROTO)
+        # The rings are bound once `start` returns, nothing to wait for
+        sniffer.start()
+        return sniffer
 
     sniffer = AsyncSniffer(
         # All ifaces
@@ -56,6 +53,7 @@ def start_sniffing(net: Mininet, port, ifaces_fn = all_ifaces, cb: Optional[Call
         filter="ether proto 0x1234",
         store=False,
         prn=cb,
+        L2socket=RawL2ListenSocket,
     )
 
     sniffer.start()
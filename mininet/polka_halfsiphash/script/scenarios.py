@@ -11,16 +11,20 @@ from mn_wifi.bmv2 import P4Switch
 from mn_wifi.net import info, Mininet
 
 from scapy.all import Packet
-from .scapy import Polka, PolkaProbe, start_sniffing
+from .scapy import start_sniffing
+from .probe_parser import parse_probe
+from .utils import edge_of_iface
 
 from .call_api import (
     call_deploy_flow_contract,
-    call_set_ref_sig,
+    submit_set_ref_sig,
     hash_flow_id,
-    call_log_probe,
+    submit_log_probe,
+    submissions,
     call_get_flow_compliance,
     call_get_flow_compliance_consolidation,
-    call_set_new_route
+    call_set_new_route,
+    wait_for_flow
 ) 
 
 BMV2_TOOLS_PATH = Environ.get('BMV2_TOOLS_PATH')
@@ -84,24 +88,29 @@ def ifaces_fn(net: Mininet, port):
         if iname.match(iface)
     ]
 
+def handle_frame(frame, iface: str):
+    """Registers the reference signature (ingress) or logs the probe (egress) of a raw frame"""
+    probe = parse_probe(frame)
+    assert probe is not None, "❌ PolkaProbe not found"
+    assert probe.icmp_type is not None, "❌ ICMP layer not found"
+
+    if (probe.icmp_type == 8):
+        if(probe.timestamp == probe.l_hash):
+            submit_set_ref_sig(probe, edge_of_iface(iface))
+        else:
+            submit_log_probe(probe)
+
 def sniff_cb(pkt: Packet):
     assert pkt.sniffed_on is not None, (
         "❌ Packet not sniffed on any interface. WTF."
     )
-    polka = pkt.getlayer(Polka)
-    assert polka is not None, "❌ Polka layer not found"
-    probe = pkt.getlayer(PolkaProbe)
-    assert probe is not None, "❌ PolkaProbe layer not found"
-    eth = pkt.getlayer("Ether")
-    assert eth is not None, "❌ Ether layer not found"
-    icmp = pkt.getlayer("ICMP")
-    assert icmp is not None, "❌ ICMP layer not found"
-
-    if (icmp.type == 8):
-        if(probe.timestamp == probe.l_hash):
-            call_set_ref_sig(pkt)
-        else:
-            call_log_probe(pkt)
+    # The sniffer hands frames undissected (see `start_sniffing`), `original` holds the raw bytes
+    handle_frame(pkt.original, pkt.sniffed_on)
+
+def sniff_batch_cb(frames):
+    # Ring backend: one call per block of `(frame, iface)`, frames are only valid during the call
+    for frame, iface in frames:
+        handle_frame(frame, iface)
 
 def integrity(net: Mininet, flows):
     """
@@ -247,6 +256,9 @@ def integrity(net: Mininet, flows):
                                 )
 
                                 flow["current_route"] = route_id
+                                # Probes of the old route must be on-chain before the route changes
+                                submissions.join()
+                                wait_for_flow(flow["flow_id"])
                                 call_set_new_route(flow["flow_id"], route_id)
 
                             else:
@@ -465,7 +477,7 @@ def linear(case):
                 )
                 flow["flow_id"] = flow_id
 
-        sniff = start_sniffing(net, 2, ifaces_fn=ifaces_fn, cb=sniff_cb)
+        sniff = start_sniffing(net, 2, ifaces_fn=ifaces_fn, cb=sniff_cb, batch_cb=sniff_batch_cb)
 
         integrity(net, linear_flows)
 
@@ -474,6 +486,9 @@ def linear(case):
 
         info("*** Stopping sniffing\n")
         sniff.stop()
+        # Posts the probes still queued
+        submissions.stop()
+        info(f"*** Submissions: {submissions.stats()}\n")
 
         info("*** LINEAR TOPOLOGY DONE ***\n")
 
@@ -519,7 +534,7 @@ def simple():
                 )
                 flow["flow_id"] = flow_id
 
-        sniff = start_sniffing(net, 6, ifaces_fn=ifaces_fn, cb=sniff_cb)
+        sniff = start_sniffing(net, 6, ifaces_fn=ifaces_fn, cb=sniff_cb, batch_cb=sniff_batch_cb)
 
         integrity(net, simple_flows)
 
@@ -528,6 +543,9 @@ def simple():
 
         info("*** Stopping sniffing\n")
         sniff.stop()
+        # Posts the probes still queued
+        submissions.stop()
+        info(f"*** Submissions: {submissions.stats()}\n")
 
         info("*** SIMPLE TOPOLOGY DONE ***\n")
 
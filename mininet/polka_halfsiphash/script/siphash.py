@@ -1,3 +1,5 @@
+import numpy as np
+
 # from typing import Annotated
 
 # _64Bit = Annotated[bytes, "64-bit"]
@@ -5,6 +7,8 @@
 
 
 class State:
+    __slots__ = ("v0", "v1", "v2", "v3")
+
     def __init__(self, key: bytes) -> None:
     # def __init__(self, key: _64Bit) -> None:
         k0 = int.from_bytes(key[:4], byteorder="big")
@@ -43,9 +47,8 @@ class State:
         # )
 
 
-def siphash(key: bytes, data: bytes) -> bytes:
-# def siphash(key: _64Bit, data: _32Bit) -> _32Bit:
-    """Hashes a single datum using especified key. Does not keep state. (so it is single-use|stateless)"""
+def siphash_state(key: bytes, data: bytes) -> bytes:
+    """Reference implementation of `siphash`, step by step over a `State`. Kept for comparison."""
     s = State(key)
     b = 0x0400_0000
     m = int.from_bytes(data, byteorder="little")
@@ -71,3 +74,146 @@ def siphash(key: bytes, data: bytes) -> bytes:
     # print(f"r: 0x{r.hex()}")
 
     return r
+
+
+def _halfsiphash(k0: int, k1: int, m: int) -> int:
+    """HalfSipHash-2-4 of a single 32-bit word `m` (already read as little-endian).
+
+    Same steps as `siphash_state`, with the state kept in locals and the rounds inlined.
+    """
+    v0 = k0
+    v1 = k1
+    v2 = k0 ^ 0x6C79_6765
+    v3 = k1 ^ 0x7465_6462 ^ m
+
+    for _ in range(2):
+        v0 = (v0 + v1) & 0xFFFF_FFFF
+        v1 = ((v1 << 5) | (v1 >> 27)) & 0xFFFF_FFFF
+        v1 ^= v0
+        v0 = ((v0 << 16) | (v0 >> 16)) & 0xFFFF_FFFF
+        v2 = (v2 + v3) & 0xFFFF_FFFF
+        v3 = ((v3 << 8) | (v3 >> 24)) & 0xFFFF_FFFF
+        v3 ^= v2
+        v0 = (v0 + v3) & 0xFFFF_FFFF
+        v3 = ((v3 << 7) | (v3 >> 25)) & 0xFFFF_FFFF
+        v3 ^= v0
+        v2 = (v2 + v1) & 0xFFFF_FFFF
+        v1 = ((v1 << 13) | (v1 >> 19)) & 0xFFFF_FFFF
+        v1 ^= v2
+        v2 = ((v2 << 16) | (v2 >> 16)) & 0xFFFF_FFFF
+    v0 ^= m
+
+    v3 ^= 0x0400_0000
+    for _ in range(2):
+        v0 = (v0 + v1) & 0xFFFF_FFFF
+        v1 = ((v1 << 5) | (v1 >> 27)) & 0xFFFF_FFFF
+        v1 ^= v0
+        v0 = ((v0 << 16) | (v0 >> 16)) & 0xFFFF_FFFF
+        v2 = (v2 + v3) & 0xFFFF_FFFF
+        v3 = ((v3 << 8) | (v3 >> 24)) & 0xFFFF_FFFF
+        v3 ^= v2
+        v0 = (v0 + v3) & 0xFFFF_FFFF
+        v3 = ((v3 << 7) | (v3 >> 25)) & 0xFFFF_FFFF
+        v3 ^= v0
+        v2 = (v2 + v1) & 0xFFFF_FFFF
+        v1 = ((v1 << 13) | (v1 >> 19)) & 0xFFFF_FFFF
+        v1 ^= v2
+        v2 = ((v2 << 16) | (v2 >> 16)) & 0xFFFF_FFFF
+    v0 ^= 0x0400_0000
+    v2 ^= 0x0000_00FF
+
+    for _ in range(4):
+        v0 = (v0 + v1) & 0xFFFF_FFFF
+        v1 = ((v1 << 5) | (v1 >> 27)) & 0xFFFF_FFFF
+        v1 ^= v0
+        v0 = ((v0 << 16) | (v0 >> 16)) & 0xFFFF_FFFF
+        v2 = (v2 + v3) & 0xFFFF_FFFF
+        v3 = ((v3 << 8) | (v3 >> 24)) & 0xFFFF_FFFF
+        v3 ^= v2
+        v0 = (v0 + v3) & 0xFFFF_FFFF
+        v3 = ((v3 << 7) | (v3 >> 25)) & 0xFFFF_FFFF
+        v3 ^= v0
+        v2 = (v2 + v1) & 0xFFFF_FFFF
+        v1 = ((v1 << 13) | (v1 >> 19)) & 0xFFFF_FFFF
+        v1 ^= v2
+        v2 = ((v2 << 16) | (v2 >> 16)) & 0xFFFF_FFFF
+
+    return v1 ^ v3
+
+
+def siphash(key: bytes, data: bytes) -> bytes:
+# def siphash(key: _64Bit, data: _32Bit) -> _32Bit:
+    """Hashes a single datum using especified key. Does not keep state. (so it is single-use|stateless)"""
+    k = int.from_bytes(key, byteorder="big")
+    m = int.from_bytes(data, byteorder="little")
+    r = _halfsiphash(k >> 32, k & 0xFFFF_FFFF, m)
+    return r.to_bytes(4, byteorder="little")
+
+
+def siphash_words(k0: int, k1: int, data: bytes) -> bytes:
+    """Same as `siphash`, with the key already split into its two 32-bit words (k0 is the high one)"""
+    m = int.from_bytes(data, byteorder="little")
+    return _halfsiphash(k0, k1, m).to_bytes(4, byteorder="little")
+
+
+def _rotl_batch(x: np.ndarray, b: int) -> np.ndarray:
+    # uint32 lanes wrap on their own, no bit-mask needed
+    return (x << np.uint32(b)) | (x >> np.uint32(32 - b))
+
+
+def _sipround_batch(v0, v1, v2, v3):
+    """Same shuffle as `State.sipround`, applied to every lane of the batch at once."""
+    v0 += v1
+    v1 = _rotl_batch(v1, 5)
+    v1 ^= v0
+    v0 = _rotl_batch(v0, 16)
+    v2 += v3
+    v3 = _rotl_batch(v3, 8)
+    v3 ^= v2
+    v0 += v3
+    v3 = _rotl_batch(v3, 7)
+    v3 ^= v0
+    v2 += v1
+    v1 = _rotl_batch(v1, 13)
+    v1 ^= v2
+    v2 = _rotl_batch(v2, 16)
+    return v0, v1, v2, v3
+
+
+def siphash_batch(keys, data) -> np.ndarray:
+    """Hashes many (key, datum) pairs at once. Bit-exact with `siphash` and `polka/siphash.p4`.
+
+    `keys` are 64-bit integers (the key bytes read as big-endian) and `data` are 32-bit integers
+    (the datum bytes read as big-endian, as the header fields are on the wire).
+    Returns an uint32 array where `r[i] == int.from_bytes(siphash(key_i, datum_i), "big")`.
+    """
+    keys = np.atleast_1d(np.asarray(keys, dtype=np.uint64))
+    data = np.atleast_1d(np.asarray(data, dtype=np.uint32))
+    keys, data = np.broadcast_arrays(keys, data)
+
+    k0 = (keys >> np.uint64(32)).astype(np.uint32)
+    k1 = (keys & np.uint64(0xFFFF_FFFF)).astype(np.uint32)
+    b = np.uint32(0x0400_0000)
+    # Same as reading the datum as little-endian (`flip_endianness` on the p4 side)
+    m = data.byteswap()
+
+    v0 = k0 ^ np.uint32(0x0000_0000)
+    v1 = k1 ^ np.uint32(0x0000_0000)
+    v2 = k0 ^ np.uint32(0x6C79_6765)
+    v3 = k1 ^ np.uint32(0x7465_6462)
+
+    v3 ^= m
+    v0, v1, v2, v3 = _sipround_batch(v0, v1, v2, v3)
+    v0, v1, v2, v3 = _sipround_batch(v0, v1, v2, v3)
+    v0 ^= m
+
+    v3 ^= b
+    v0, v1, v2, v3 = _sipround_batch(v0, v1, v2, v3)
+    v0, v1, v2, v3 = _sipround_batch(v0, v1, v2, v3)
+    v0 ^= b
+    v2 ^= np.uint32(0x0000_00FF)
+
+    for _ in range(4):
+        v0, v1, v2, v3 = _sipround_batch(v0, v1, v2, v3)
+
+    return (v1 ^ v3).byteswap()
@@ -0,0 +1,274 @@
+"""
+Bounded queue between the sniffer and the API, so capture never waits on HTTP or on the blockchain.
+
+Submissions are sharded by key (the flow id) over the worker threads: the probes of a flow are posted
+in the order they were captured, so a reference signature still reaches the API before its egress probe.
+"""
+
+import os
+import pickle
+import queue
+import shutil
+import threading
+from collections import Counter
+from os import environ as Environ
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+BLOCK = "block"  # The sniffer waits for room
+DROP_OLDEST = "drop-oldest"  # The oldest pending submission of the shard is discarded
+SPILL = "spill"  # Goes to a file, posted once the queue is empty again. Later submissions of that flow follow it
+POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+# (path, payload builder, builder args). Payloads are built by the workers, off the capture thread
+Submission = Tuple[str, Callable[..., dict], tuple]
+Send = Callable[[str, dict], Any]
+# Posts several `(path, data)` at once, in as few requests as it sees fit
+SendBatch = Callable[[List[Tuple[str, dict]]], Any]
+
+
+class SubmissionQueue:
+    def __init__(
+        self,
+        send: Send,
+        workers: int = 4,
+        maxsize: int = 10_000,
+        policy: str = BLOCK,
+        spill_path: Optional[str] = None,
+        send_batch: Optional[SendBatch] = None,
+        batch_size: int = 64,
+    ):
+        """`send(path, data)` posts one payload. `maxsize` bounds the pending submissions of all workers.
+        The `SPILL` policy needs a `spill_path`.
+
+        With `send_batch`, a worker takes whatever is pending on its shard (up to `batch_size`)
+        and hands it over in one call, in queue order.
+        """
+        assert policy in POLICIES, f"❌ Unknown policy {policy}, expected one of {POLICIES}"
+        assert policy != SPILL or spill_path, "❌ The spill policy needs a spill_path"
+        assert workers > 0, "❌ At least one worker is needed"
+
+        self.send = send
+        self.policy = policy
+        self.spill_path = spill_path
+        self.send_batch = send_batch
+        self.batch_size = batch_size if send_batch is not None else 1
+        self._queues: List["queue.Queue[Submission]"] = [
+            queue.Queue(maxsize=max(1, maxsize // workers)) for _ in range(workers)
+        ]
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        # Flows with submissions in the spill file, or in the one being replayed: theirs go there too, to keep them in order
+        self._spilled: Set[str] = set()
+        self._replaying: Set[str] = set()
+        if policy == SPILL:
+            _recover_replay(spill_path)
+            if os.path.exists(spill_path):
+                self._spilled = {key for key, _, _, _ in _read_spill(spill_path)}
+        self.counters: Counter = Counter(submitted=0, sent=0, batches=0, errors=0, dropped=0, spilled=0, replayed=0)
+
+    @classmethod
+    def from_env(cls, send: Send, send_batch: Optional[SendBatch] = None) -> "SubmissionQueue":
+        """Configured by `SUBMIT_WORKERS`, `SUBMIT_QUEUE_SIZE`, `SUBMIT_POLICY`, `SUBMIT_SPILL_PATH`
+        and `SUBMIT_BATCH_SIZE` (1 disables batching)"""
+        batch_size = int(Environ.get("SUBMIT_BATCH_SIZE", 64))
+        return cls(
+            send,
+            workers=int(Environ.get("SUBMIT_WORKERS", 4)),
+            maxsize=int(Environ.get("SUBMIT_QUEUE_SIZE", 10_000)),
+            policy=Environ.get("SUBMIT_POLICY", BLOCK),
+            spill_path=Environ.get("SUBMIT_SPILL_PATH", "submissions.spill"),
+            send_batch=send_batch if batch_size > 1 else None,
+            batch_size=batch_size,
+        )
+
+    # --- Producer side --- #
+
+    def submit(self, key: str, path: str, build: Callable[..., dict], *args) -> bool:
+        """Queues `send(path, build(*args))` on the worker of `key`. Returns `False` if it was dropped or spilled."""
+        if not self._threads:
+            self.start()
+
+        shard = self._queues[hash(key) % len(self._queues)]
+        item: Submission = (path, build, args)
+        self._count("submitted")
+
+        if self.policy == BLOCK:
+            shard.put(item)
+            return True
+
+        if self.policy == SPILL:
+            with self._spill_lock:
+                if key not in self._spilled and key not in self._replaying:
+                    try:
+                        shard.put_nowait(item)
+                        return True
+                    except queue.Full:
+                        pass
+                self._spill(key, item)
+            return False
+
+        while True:
+            try:
+                shard.put_nowait(item)
+                return True
+            except queue.Full:
+                pass
+
+            try:
+                shard.get_nowait()
+                shard.task_done()
+                self._count("dropped")
+            except queue.Empty:
+                # A worker took one meanwhile, there is room now
+                pass
+
+    def _spill(self, key: str, item: Submission):
+        """Appends `item` as is: the payload is built on replay, not on the capture thread. Needs `_spill_lock`"""
+        path, build, args = item
+        with open(self.spill_path, "ab") as f:
+            pickle.dump((key, path, build, args), f)
+        self._spilled.add(key)
+        self._count("spilled")
+
+    # --- Worker side --- #
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for i, shard in enumerate(self._queues):
+                thread = threading.Thread(target=self._work, args=(shard,), name=f"submit-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self, shard: "queue.Queue[Submission]"):
+        while True:
+            try:
+                items = [shard.get(timeout=0.5)]
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                if self.policy == SPILL:
+                    self._replay()
+                continue
+
+            # Takes what else is already pending, without waiting for more
+            while len(items) < self.batch_size:
+                try:
+                    items.append(shard.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._post([(path, build(*args)) for path, build, args in items])
+            except Exception as e:
+                self._count("errors", len(items))
+                print(f"*** Submission failed: {e!r}")
+            finally:
+                for _ in items:
+                    shard.task_done()
+
+    def _post(self, batch: List[Tuple[str, dict]]):
+        if not batch:
+            return
+        if self.send_batch is not None and len(batch) > 1:
+            self.send_batch(batch)
+            self._count("batches")
+        else:
+            for path, data in batch:
+                self.send(path, data)
+        self._count("sent", len(batch))
+
+    def _replay(self):
+        """Posts what was spilled, once every shard is idle. Only one worker replays at a time."""
+        if not self._spill_lock.acquire(blocking=False):
+            return
+        try:
+            # Also waits for what the workers are posting, which a replayed submission must not overtake
+            if any(shard.unfinished_tasks for shard in self._queues) or not os.path.exists(self.spill_path):
+                return
+            replaying = self.spill_path + ".replay"
+            os.replace(self.spill_path, replaying)
+            # Submissions of these flows keep going to the spill file until the replay is over
+            self._replaying, self._spilled = self._spilled, set()
+        finally:
+            self._spill_lock.release()
+
+        batch = []
+        for _, path, build, args in _read_spill(replaying):
+            batch.append((path, build, args))
+            if len(batch) >= self.batch_size:
+                self._post_replayed(batch)
+                batch = []
+        self._post_replayed(batch)
+        os.remove(replaying)
+        with self._spill_lock:
+            self._replaying = set()
+
+    def _post_replayed(self, batch: List[Submission]):
+        try:
+            self._post([(path, build(*args)) for path, build, args in batch])
+            self._count("replayed", len(batch))
+        except Exception as e:
+            self._count("errors", len(batch))
+            print(f"*** Spilled submissions failed: {e!r}")
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    # --- Control --- #
+
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._queues)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["depth"] = self.depth()
+        return stats
+
+    def join(self):
+        """Waits until every queued submission was posted (spilled ones excluded)"""
+        for shard in self._queues:
+            shard.join()
+
+    def stop(self):
+        """Posts what is pending, then stops the workers. Spilled submissions stay on disk for the next run."""
+        if not self._threads:
+            return
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+def _recover_replay(spill_path: str):
+    """Puts back a replay that did not finish (the process died meanwhile) in front of what was spilled after it.
+    Its submissions are all posted again, including the ones that were already posted before."""
+    replaying = spill_path + ".replay"
+    if not os.path.exists(replaying):
+        return
+    if os.path.exists(spill_path):
+        merging = spill_path + ".merge"
+        with open(merging, "wb") as out:
+            for path in (replaying, spill_path):
+                with open(path, "rb") as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(merging, spill_path)
+        os.remove(replaying)
+    else:
+        os.replace(replaying, spill_path)
+
+
+def _read_spill(path: str) -> Iterator[Tuple[str, str, Callable[..., dict], tuple]]:
+    """The `(key, path, build, args)` records of a spill file, in the order they were spilled"""
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
@@ -0,0 +1,198 @@
+"""
+Generic description of the core (PolKA) switches of a network and the links between them.
+Shared by `calc_digests` (through `Node.ports`) and by the Mininet builders.
+"""
+
+import json
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .polka_nhop import Node, NodeGroup
+from .polka_route import irreducible_node_ids
+
+# Ports 0 and 1 are the local/edge ports, an exit port below 2 ends the path
+FIRST_CORE_PORT = 2
+
+# (node name, port, neighbor name, neighbor port)
+Link = Tuple[str, int, str, int]
+
+
+class Topology:
+    def __init__(self, name: str, nodes: Iterable[Tuple[str, int]], links: Iterable[Link] = ()):
+        """Creates a topology from `(name, node_id)` pairs and bidirectional `(name, port, name, port)` links.
+
+        The wiring is kept as compact adjacency arrays (CSR): the links of node `i` are the entries
+        `port_offsets[i]:port_offsets[i + 1]` of `link_ports` (local port), `link_neighbors` (index of the
+        neighbor node) and `link_peer_ports` (port on the neighbor side), sorted by local port.
+        """
+        self.name = name
+        self.nodes: List[Node] = []
+        self.nodes_by_name: Dict[str, Node] = {}
+        self.nodes_by_id: Dict[int, Node] = {}
+        self._index: Dict[str, int] = {}
+        for node_name, node_id in nodes:
+            assert node_name not in self._index, f"❌ Duplicated node {node_name}"
+            node = Node(node_name, node_id)
+            self._index[node_name] = len(self.nodes)
+            self.nodes.append(node)
+            self.nodes_by_name[node_name] = node
+            self.nodes_by_id[node_id] = node
+
+        self.node_ids = np.array([node.node_id for node in self.nodes], dtype=np.uint32)
+        self.version = 0
+        self._links: List[Tuple[int, int, int, int]] = []
+        self._used_ports = set()
+        self._group: Optional[NodeGroup] = None
+        self.add_links(links)
+
+    def node(self, name: str) -> Node:
+        try:
+            return self.nodes_by_name[name]
+        except KeyError:
+            raise ValueError(f"No node named {name!r} on the {self.name} topology")
+
+    @property
+    def group(self) -> NodeGroup:
+        """All nodes as a `NodeGroup`, to evaluate a route_id on the whole topology at once"""
+        if self._group is None:
+            self._group = NodeGroup(self.nodes)
+        return self._group
+
+    def add_links(self, links: Iterable[Link]):
+        """Adds bidirectional links and rewires `Node.ports`. Bumps `version`, invalidating cached paths."""
+        for name_a, port_a, name_b, port_b in links:
+            a, b = self._index[name_a], self._index[name_b]
+            for (i, port_i), (j, port_j) in (((a, port_a), (b, port_b)), ((b, port_b), (a, port_a))):
+                assert port_i >= FIRST_CORE_PORT, f"❌ Port {port_i} of {self.nodes[i].name} is reserved"
+                assert (i, port_i) not in self._used_ports, f"❌ Port {port_i} of {self.nodes[i].name} already in use"
+                self._used_ports.add((i, port_i))
+                self._links.append((i, port_i, j, port_j))
+        self._build()
+
+    def _build(self):
+        self._links.sort()
+        links = np.array(self._links, dtype=np.int32).reshape(len(self._links), 4)
+        self.port_offsets = np.searchsorted(links[:, 0], np.arange(len(self.nodes) + 1)).astype(np.int32)
+        self.link_ports = links[:, 1].astype(np.uint16)
+        self.link_neighbors = links[:, 2].copy()
+        self.link_peer_ports = links[:, 3].astype(np.uint16)
+
+        for i, node in enumerate(self.nodes):
+            start, end = self.port_offsets[i], self.port_offsets[i + 1]
+            ports: List[Optional[Node]] = [None] * (int(self.link_ports[end - 1]) + 1 if end > start else FIRST_CORE_PORT)
+            for port, neighbor in zip(self.link_ports[start:end], self.link_neighbors[start:end]):
+                ports[port] = self.nodes[neighbor]
+            node.ports = ports
+
+        self.version += 1
+
+    def links(self) -> List[Link]:
+        """Each link once, as `(name, port, name, port)`, in node/port order"""
+        return [
+            (self.nodes[i].name, port_i, self.nodes[j].name, port_j)
+            for i, port_i, j, port_j in self._links
+            if (i, port_i) < (j, port_j)
+        ]
+
+    def add_core_links(self, net, switches: Dict[str, object], **link_opts) -> list:
+        """Creates the links of this topology on a Mininet `net`, with the same port numbers.
+        `switches` maps node names to the Mininet switches. Extra `link_opts` (`bw`...) go to `net.addLink`."""
+        return [
+            net.addLink(switches[name_a], switches[name_b], port1=port_a, port2=port_b, **link_opts)
+            for name_a, port_a, name_b, port_b in self.links()
+        ]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return f"Topology({self.name}, {len(self.nodes)} nodes, {len(self._links) // 2} links)"
+
+    # --- Loading and saving --- #
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Topology":
+        """`{"name": ..., "nodes": [[name, node_id], ...], "links": [[name, port, name, port], ...]}`.
+        node_ids may be ints or strings such as "0x002B"."""
+        nodes = [(name, node_id if isinstance(node_id, int) else int(node_id, 0)) for name, node_id in data["nodes"]]
+        links = [tuple(link) for link in data.get("links", [])]
+        return cls(data.get("name", "topology"), nodes, links)
+
+    @classmethod
+    def from_file(cls, path: str) -> "Topology":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "nodes": [[node.name, f"{node.node_id:#06x}"] for node in self.nodes],
+            "links": [list(link) for link in self.links()],
+        }
+
+    def to_file(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    # --- Generators --- #
+
+    @staticmethod
+    def _named_nodes(n: int, node_ids: Optional[Sequence[int]]) -> List[Tuple[str, int]]:
+        """`s1..sN`. node_ids default to the first irreducible polynomials, as the hand-made topologies use"""
+        if node_ids is None:
+            node_ids = list(islice(irreducible_node_ids(), n))
+        assert len(node_ids) >= n, f"❌ Need {n} node_ids, got {len(node_ids)}"
+        return [(f"s{i}", node_ids[i - 1]) for i in range(1, n + 1)]
+
+    @classmethod
+    def linear(cls, n: int, node_ids: Optional[Sequence[int]] = None, name: str = "linear") -> "Topology":
+        """`s1 - s2 - ... - sN`. Port 2 goes to the previous switch and port 3 to the next one (port 2 on `s1`),
+        which is how Mininet numbers them when the edge link is created first"""
+        nodes = cls._named_nodes(n, node_ids)
+        links = [
+            (f"s{i}", FIRST_CORE_PORT if i == 1 else FIRST_CORE_PORT + 1, f"s{i + 1}", FIRST_CORE_PORT)
+            for i in range(1, n)
+        ]
+        return cls(name, nodes, links)
+
+    @classmethod
+    def ring(cls, n: int, node_ids: Optional[Sequence[int]] = None, name: str = "ring") -> "Topology":
+        """Every `si` links to `s(i+1)` on port 3 (their port 2), closing `sN` back to `s1`"""
+        assert n >= 3, "❌ A ring needs at least 3 nodes"
+        nodes = cls._named_nodes(n, node_ids)
+        links = [(f"s{i}", FIRST_CORE_PORT + 1, f"s{i % n + 1}", FIRST_CORE_PORT) for i in range(1, n + 1)]
+        return cls(name, nodes, links)
+
+    @classmethod
+    def fat_tree(cls, k: int, node_ids: Optional[Sequence[int]] = None, name: str = "fat_tree") -> "Topology":
+        """k-ary fat-tree: k pods of k/2 edge and k/2 aggregation switches, plus (k/2)^2 core switches.
+
+        Switches are numbered edge first (`s1..`, pod by pod), then aggregation, then core, so edge `eN`
+        enters through `sN`. On edge switches ports 2.. go to the aggregation switches of the pod. On
+        aggregation switches ports 2.. go to the edge switches and ports k/2+2.. to the core. On core
+        switches port 2+p goes to pod `p`.
+        """
+        assert k >= 2 and k % 2 == 0, "❌ k must be even"
+        half = k // 2
+        n_edge = n_agg = k * half
+        nodes = cls._named_nodes(n_edge + n_agg + half * half, node_ids)
+
+        def edge(pod, i):
+            return f"s{1 + pod * half + i}"
+
+        def agg(pod, i):
+            return f"s{1 + n_edge + pod * half + i}"
+
+        def core(i, j):
+            return f"s{1 + n_edge + n_agg + i * half + j}"
+
+        links = []
+        for pod in range(k):
+            for a in range(half):
+                for e in range(half):
+                    links.append((edge(pod, e), FIRST_CORE_PORT + a, agg(pod, a), FIRST_CORE_PORT + e))
+                for c in range(half):
+                    links.append((agg(pod, a), FIRST_CORE_PORT + half + c, core(a, c), FIRST_CORE_PORT + pod))
+        return cls(name, nodes, links)
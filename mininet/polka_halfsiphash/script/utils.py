@@ -1,10 +1,13 @@
-from .siphash import siphash
+from .siphash import siphash_words
+from .key_schedule import hop_key_words
 from .polka_nhop import Node
-from ..linear_topology.nodes import LINEAR_NODES
-from ..simple_topology.nodes import SIMPLE_NODES
+from .registry import topology_of
+from .topology import Topology
+from .probe_parser import IP_PROTO_TCP, ProbeFields, parse_probe
 from hashlib import sha256
-
-edge_nodes = [f"e{i}" for i in range(1, 11)]
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
 
 polka_route_ids = {
     "h1": {
@@ -21,41 +24,26 @@ polka_route_ids = {
     }
 }
 
-def calc_digests(route_id: int, node_id: str, seed: int) -> list:
-    """Calculates the digest for each node in the path.
-    Returns a list of digests.
+PATH_CACHE_SIZE = 4096
 
-    @param node The name or index of the node to start from. If hostname is `s1`, index should be `1`.
-    """
-    if node_id in edge_nodes:
-        node_id = f"s{node_id[1:]}"
 
-    node = None
-    simple_routesIds = [75440656914980, 165772661694262, 222884173467157, 215038458956314, 11476003314842104240, 10482717147535550117]
+def invalidate_paths():
+    """Drops every cached path. Only needed after changing `Node.ports` by hand,
+    rewiring through `Topology.add_links` bumps its version instead."""
+    _resolve_path.cache_clear()
 
-    if isinstance(node_id, str):
-        if route_id in simple_routesIds:
-            node = [n for n in SIMPLE_NODES if n.name == node_id][0]
-        else:
-            node = [n for n in LINEAR_NODES if n.name == node_id][0]
-    else:
-        raise ValueError("Invalid `node_id` parameter")
 
-    digests = [seed.to_bytes(4, byteorder="big")]
-    visited_nodes = []
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def _resolve_path(route_id: int, node: Node, version: int) -> Tuple[Tuple[int, int], ...]:
+    hops = []
+    visited_nodes = {}  # Insertion-ordered set
     while True:
         if node in visited_nodes:
-            raise ValueError(f"Loop detected. Visited {visited_nodes!r}")
-        visited_nodes.append(node)
+            raise ValueError(f"Loop detected. Visited {list(visited_nodes)!r}")
+        visited_nodes[node] = None
 
         exit_port = node.nhop(route_id)
-        keystr = f"{node.node_id:016b}{exit_port:09b}{seed:032b}{0:07b}"
-        key = int(keystr, base=2).to_bytes(8, byteorder="big")
-        # print(f"key: 0x{key.hex()}")
-
-        new_digest = siphash(key, digests[-1])
-        digests.append(new_digest)
-        # print(f"{node.name} => 0x{digests[-1].hex()}")
+        hops.append((node.node_id, exit_port))
 
         if exit_port < 2:
             # This means the packet has reached the edge
@@ -63,7 +51,43 @@ def calc_digests(route_id: int, node_id: str, seed: int) -> list:
             break
         next_node = node.ports[exit_port]
         assert isinstance(next_node, Node), f"Invalid next node: {next_node}"
-        node: Node = next_node
+        node = next_node
+
+    return tuple(hops)
+
+
+def resolve_path(route_id: int, node: Node, version: int = 0) -> Tuple[Tuple[int, int], ...]:
+    """Returns the `(node_id, exit_port)` of each hop `route_id` takes starting on `node`.
+    Resolved once per route, ingress node and topology `version`, then served from an LRU cache."""
+    return _resolve_path(route_id, node, version)
+
+
+def calc_digests(route_id: int, node_id: str, seed: int, topology: Optional[Topology] = None) -> list:
+    """Calculates the digest for each node in the path.
+    Returns a list of digests.
+
+    @param node The name or index of the node to start from. If hostname is `s1`, index should be `1`.
+    @param topology Where the path runs. Defaults to the known topology `route_id` belongs to.
+    """
+    if not isinstance(node_id, str):
+        raise ValueError("Invalid `node_id` parameter")
+
+    if node_id[:1] == "e" and node_id[1:].isdigit():
+        # Edge `eN` enters the core through `sN`
+        node_id = f"s{node_id[1:]}"
+
+    if topology is None:
+        topology = topology_of(route_id)
+    node = topology.node(node_id)
+
+    digests = [seed.to_bytes(4, byteorder="big")]
+    for hop_node_id, exit_port in resolve_path(route_id, node, topology.version):
+        k0, k1 = hop_key_words(hop_node_id, exit_port, seed)
+        # print(f"key: 0x{k0:08x}{k1:08x}")
+
+        new_digest = siphash_words(k0, k1, digests[-1])
+        digests.append(new_digest)
+        # print(f"{hop_node_id} => 0x{digests[-1].hex()}")
 
     return digests
 
@@ -75,29 +99,32 @@ def hash_flow_id(ip_src, port_src, ip_dst, port_dst):
     
     return hash_hex
 
-def calc_flow_id(pkt):
-    ip_pkt = pkt.getlayer("IP")
-    assert ip_pkt is not None, "❌ IP layer not found"
-
-    tcp_pkt = pkt.getlayer("TCP")
-    if tcp_pkt is None:
-        port_src = "0"
-        port_dst = "0"
+def probe_flow_id(probe: ProbeFields) -> str:
+    """Flow id of a parsed probe. Only TCP ports take part in it, other protocols use "0"."""
+    if probe.ip_proto == IP_PROTO_TCP:
+        port_src, port_dst = str(probe.sport), str(probe.dport)
     else:
-        port_src = tcp_pkt.sport
-        port_dst = tcp_pkt.dport
+        port_src = port_dst = "0"
 
-    ip_src = ip_pkt.src
-    ip_dst = ip_pkt.dst
+    return hash_flow_id(probe.ip_src, port_src, probe.ip_dst, port_dst)
 
-    return hash_flow_id(ip_src, port_src, ip_dst, port_dst)
+def calc_flow_id(pkt):
+    # Reads the frame bytes Scapy kept, instead of the dissected layers
+    probe = parse_probe(pkt.original or bytes(pkt))
+    assert probe is not None, "❌ Polka probe not found"
 
-def get_ingress_edge(pkt):
-    import re 
-    pattern = r"\S\d+"
-    match = re.search(pattern, pkt.sniffed_on)
+    return probe_flow_id(probe)
+
+_EDGE_PATTERN = re.compile(r"\S\d+")
+
+def edge_of_iface(iface: str) -> str:
+    """Switch name of an interface name. `e1-eth2` -> `e1`"""
+    match = _EDGE_PATTERN.search(iface)
 
     if match:
         return match.group() 
     else:
         return "s1"
+
+def get_ingress_edge(pkt):
+    return edge_of_iface(pkt.sniffed_on)
@@ -0,0 +1,99 @@
+"""
+Offline verification of PolKA probes from pcap/pcapng captures, without Mininet or the blockchain.
+
+Counts, per flow, what the contract would: a probe whose `l_hash` matches the reference signature
+registered for its timestamp is a success, a mismatch is a fail and a probe without reference is nil.
+Reference signatures come from the ingress probes (`timestamp == l_hash`), as in `scenarios.sniff_cb`.
+
+Run from the `mininet` folder:
+    python3 -m polka_halfsiphash.script.verify_pcap capture.pcapng [more.pcap ...] [--ingress e1]
+"""
+
+import argparse
+import json
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from scapy.utils import RawPcapReader
+
+from .probe_parser import parse_probe
+from .utils import calc_digests, edge_of_iface, probe_flow_id
+
+# Amount of reference signatures kept while waiting for their egress probe
+DEFAULT_WINDOW = 65536
+
+# (flow_id, route_id, timestamp, l_hash, ingress edge)
+Probe = Tuple[str, int, int, int, Optional[str]]
+
+
+def iter_probes(paths: Iterable[str]) -> Iterator[Probe]:
+    """Streams the ICMP echo-request probes of the captures, one frame in memory at a time"""
+    for path in paths:
+        # Picks pcap or pcapng from the magic number. Frames stay raw bytes, no Scapy dissection
+        with RawPcapReader(path) as reader:
+            for frame, metadata in reader:
+                probe = parse_probe(frame)
+                if probe is None or probe.icmp_type != 8:
+                    continue
+
+                # Only pcapng records the interface, which tells the edge
+                ifname = getattr(metadata, "ifname", None)
+                ingress = edge_of_iface(ifname.decode()) if ifname else None
+                yield probe_flow_id(probe), probe.route_id, probe.timestamp, probe.l_hash, ingress
+
+
+def verify(probes: Iterable[Probe], default_ingress: str = "e1", window: int = DEFAULT_WINDOW) -> Dict[str, Counter]:
+    """Returns `{flow_id: Counter(success=, fail=, nil=)}` for the probes.
+
+    Reference signatures are dropped once matched, or when more than `window` are pending,
+    so memory stays bounded no matter the size of the captures.
+    """
+    summary: Dict[str, Counter] = {}
+    references: "OrderedDict[Tuple[str, int], Optional[int]]" = OrderedDict()
+
+    for flow_id, route_id, timestamp, l_hash, ingress in probes:
+        counts = summary.setdefault(flow_id, Counter(success=0, fail=0, nil=0))
+
+        if timestamp == l_hash:
+            try:
+                expected = int.from_bytes(calc_digests(route_id, ingress or default_ingress, timestamp)[-1], "big")
+            except ValueError:
+                # Unknown node or routing loop, no reference can be set (the probe will count as nil)
+                expected = None
+            references[(flow_id, timestamp)] = expected
+            if len(references) > window:
+                references.popitem(last=False)
+            continue
+
+        expected = references.pop((flow_id, timestamp), None)
+        if expected is None:
+            counts["nil"] += 1
+        elif expected == l_hash:
+            counts["success"] += 1
+        else:
+            counts["fail"] += 1
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recomputes the reference signatures of captured PolKA probes")
+    parser.add_argument("captures", nargs="+", help="pcap or pcapng files, read in order")
+    parser.add_argument("--ingress", default="e1", help="ingress edge when the capture has no interface names")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="max pending reference signatures")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = verify(iter_probes(args.captures), default_ingress=args.ingress, window=args.window)
+
+    if args.json:
+        print(json.dumps({flow_id: dict(counts) for flow_id, counts in summary.items()}))
+        return
+
+    print(f"{'FlowId':<64} {'Success':>8} {'Fail':>8} {'Null':>8}")
+    for flow_id, counts in summary.items():
+        print(f"{flow_id:<64} {counts['success']:>8} {counts['fail']:>8} {counts['nil']:>8}")
+
+
+if __name__ == "__main__":
+    main()
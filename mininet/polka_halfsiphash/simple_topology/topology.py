@@ -9,7 +9,9 @@ from mininet.log import info
 from mn_wifi.net import Mininet  # type: ignore assumes import exists, it's from p4-utils
 from mn_wifi.bmv2 import P4Switch  # type: ignore assumes import exists, it's from p4-utils
 
-N_SWITCHES = 4
+from .nodes import SIMPLE_TOPOLOGY
+
+N_SWITCHES = len(SIMPLE_TOPOLOGY)
 LINK_SPEED = 10
 
 CORE_THRIFT_CORE_OFFSET = 50000
@@ -97,26 +99,10 @@ def simple_topology(start=True) -> Mininet:
         link = net.addLink(edges[1], cores[3], port1=6, port2=1, bw=LINK_SPEED)
         # info(f"*** Created link {link}\n")
 
-        s1 = cores[0]
-        s2 = cores[1]
-        s3 = cores[2]
-        s4 = cores[3]
-        
-        # Path 3
-        link = net.addLink(s1, s2, port1=2, port2=2, bw=LINK_SPEED)
-        # info(f"*** Created link {link}\n")
-        link = net.addLink(s2, s3, port1=3, port2=2, bw=LINK_SPEED)
-        # info(f"*** Created link {link}\n")
-        link = net.addLink(s3, s4, port1=3, port2=2, bw=LINK_SPEED)
-        # info(f"*** Created link {link}\n")
-
-        # Path 1
-        link = net.addLink(s2, s4, port1=5, port2=4, bw=LINK_SPEED)
-        # info(f"*** Created link {link}\n")
-
-        # Path 2
-        link = net.addLink(s1, s3, port1=4, port2=4, bw=LINK_SPEED)
-        # info(f"*** Created link {link}\n")
+        # Paths 1, 2 and 3, with the same ports `calc_digests` expects
+        links = SIMPLE_TOPOLOGY.add_core_links(net, {switch.name: switch for switch in cores}, bw=LINK_SPEED)
+        # for link in links:
+        #     info(f"*** Created link {link}\n")
 
         if start:
             info("*** Starting network\n")
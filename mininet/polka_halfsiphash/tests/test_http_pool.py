@@ -0,0 +1,126 @@
+import http.client
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from ..script import http_pool
+from ..script.http_pool import ConnectionPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers "ok" on a kept-alive connection. The first request to a ".../drop" path is handled,
+    then the connection is closed without an answer"""
+
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.hits.append((self.command, self.path))
+        self.server.connections.append(self.connection)
+        if self.path.endswith("/drop") and self.server.hits.count((self.command, self.path)) == 1:
+            self.close_connection = True
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.hits = []
+        self.connections = []
+        self.closed = threading.Semaphore(0)
+
+    def shutdown_request(self, request):
+        super().shutdown_request(request)
+        self.closed.release()
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _pool(server):
+    return ConnectionPool(f"http://127.0.0.1:{server.server_address[1]}/api", size=2, timeout=5)
+
+
+def _close_idle(server, reset=False):
+    """Closes the connection of the last request on the server side, as an idle timeout would"""
+    conn = server.connections[-1]
+    if reset:
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    # The handler sees the end of the stream and closes it (with a RST if `reset`)
+    conn.shutdown(socket.SHUT_RD)
+    assert server.closed.acquire(timeout=5)
+
+
+def test_reuses_the_connection(server):
+    pool = _pool(server)
+    assert pool.request("POST", "a", {"x": 1}) == (200, b"ok")
+    assert pool.request("GET", "/b") == (200, b"ok")
+    assert server.hits == [("POST", "/api/a"), ("GET", "/api/b")]
+    assert len(set(map(id, server.connections))) == 1
+
+
+def test_idle_connection_closed_by_the_server(server):
+    pool = _pool(server)
+    pool.request("POST", "a", {"x": 1})
+    _close_idle(server)
+
+    # Seen as closed before anything is sent on it
+    assert pool.request("POST", "a", {"x": 2}) == (200, b"ok")
+    assert server.hits == [("POST", "/api/a")] * 2
+
+
+def test_post_retried_when_the_send_fails(server, monkeypatch):
+    pool = _pool(server)
+    pool.request("POST", "a", {"x": 1})
+    _close_idle(server, reset=True)
+
+    # The closed connection is not noticed when taken from the pool, the send on it fails
+    monkeypatch.setattr(http_pool, "select", SimpleNamespace(select=lambda *args: ([], [], [])))
+    assert pool.request("POST", "a", {"x": 2}) == (200, b"ok")
+    assert server.hits == [("POST", "/api/a")] * 2
+
+
+def test_post_not_retried_once_sent(server):
+    pool = _pool(server)
+    pool.request("POST", "a", {"x": 1})
+
+    # The server handled it but the answer never came: posting again could apply it twice
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.request("POST", "drop", {"x": 2})
+    assert server.hits == [("POST", "/api/a"), ("POST", "/api/drop")]
+
+
+def test_get_retried_once_sent(server):
+    pool = _pool(server)
+    pool.request("GET", "a")
+    assert pool.request("GET", "drop") == (200, b"ok")
+    assert server.hits == [("GET", "/api/a"), ("GET", "/api/drop"), ("GET", "/api/drop")]
+
+
+def test_no_retry_on_a_new_connection(server):
+    pool = _pool(server)
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.request("GET", "drop")
+    assert server.hits == [("GET", "/api/drop")]
@@ -0,0 +1,54 @@
+import random
+
+from ..script.polka_nhop import Node, NodeGroup, bitmask, crc16_table, crc_for_node
+
+NODE_IDS = [0x002B, 0x002D, 0x0039, 0x003F, 0x00F5, 0x1021, 0x8005, 0xFFFF]
+
+# (node_id, route_id, port) computed with the original `crc`-package implementation of `nhop`
+KNOWN_HOPS = [
+    (189, 3973447466548256959, 274),
+    (83, 14303358200321383069995982544420848047918128963483364, 7),
+    (63, 51337577511139261232833152005967711006704250444836727, 482),
+    (83, 3905560039, 214),
+]
+
+
+def _crc_nhop(node_id, route_id):
+    """`Node.nhop` written with the generic `crc` package, as it was before the lookup tables"""
+    ndata = (route_id >> 16) & bitmask(160)
+    dif = (route_id ^ ((ndata << 16) & bitmask(160))) & bitmask(16)
+    nresult = crc_for_node(node_id).checksum(ndata.to_bytes(160 // 8, "big"))
+    return (nresult ^ dif) & bitmask(9)
+
+
+def test_crc16_table_matches_crc_package():
+    for node_id in NODE_IDS:
+        calculator = crc_for_node(node_id)
+        assert list(crc16_table(node_id)) == [calculator.checksum(bytes([byte])) for byte in range(256)]
+
+
+def test_nhop_matches_crc_package():
+    rng = random.Random(0)
+    route_ids = [0, 1, bitmask(176), bitmask(200)] + [rng.getrandbits(rng.choice((32, 64, 128, 176, 200))) for _ in range(300)]
+    for node_id in NODE_IDS:
+        node = Node(f"n{node_id}", node_id)
+        for route_id in route_ids:
+            assert node.nhop(route_id) == _crc_nhop(node_id, route_id), (node_id, route_id)
+
+
+def test_known_hops():
+    for node_id, route_id, port in KNOWN_HOPS:
+        assert Node("x", node_id).nhop(route_id) == port
+
+
+def test_node_group_matches_node_nhop():
+    rng = random.Random(1)
+    nodes = [Node(f"n{node_id}", node_id) for node_id in NODE_IDS]
+    group = NodeGroup(nodes)
+    route_ids = [0, bitmask(176), bitmask(200)] + [rng.getrandbits(rng.choice((32, 64, 176, 200))) for _ in range(100)]
+
+    ports = group.nhop_many(route_ids)
+    assert ports.shape == (len(route_ids), len(nodes))
+    for route_id, row in zip(route_ids, ports):
+        assert list(row) == [node.nhop(route_id) for node in nodes], route_id
+    assert list(group.nhop(route_ids[5])) == list(ports[5])
@@ -0,0 +1,45 @@
+import pytest
+
+from ..linear_topology.flows import flows as linear_flows
+from ..script.polka_route import compile_route, irreducible_node_ids
+from ..script.registry import LINEAR, SIMPLE
+from ..script.utils import polka_route_ids, resolve_path
+from ..simple_topology.flows import flows as simple_flows
+
+
+def _ingress(topology, host):
+    """Switch where a host's probes enter: hN on sN in the linear topology, h1-h5 on s1 and h6-h10 on s4 in the simple one"""
+    number = int(host[1:])
+    if topology is LINEAR:
+        return f"s{number}"
+    return "s1" if number <= 5 else "s4"
+
+
+def _hardcoded_routes():
+    for route_id in polka_route_ids["h1"].values():
+        if route_id:
+            # h1 -> hN on the linear topology
+            yield LINEAR, "s1", route_id
+    for topology, flows in ((LINEAR, linear_flows), (SIMPLE, simple_flows)):
+        for flow in flows.values():
+            for route_id in flow["routes"].values():
+                yield topology, _ingress(topology, flow["host_src"]), route_id
+
+
+@pytest.mark.parametrize("topology, ingress, route_id", sorted(set(_hardcoded_routes()), key=str))
+def test_compile_route_reproduces_hardcoded_route_ids(topology, ingress, route_id):
+    hops = resolve_path(route_id, topology.node(ingress))
+    path = [(topology.nodes_by_id[node_id], exit_port) for node_id, exit_port in hops]
+
+    assert compile_route(path) == route_id
+
+
+def test_linear_node_ids_are_the_first_irreducible_polynomials():
+    ids = irreducible_node_ids()
+    assert [node.node_id for node in LINEAR.nodes] == [next(ids) for _ in LINEAR.nodes]
+
+
+def test_compile_route_rejects_repeated_nodes():
+    node = LINEAR.node("s1")
+    with pytest.raises(ValueError):
+        compile_route([(node, 2), (node, 3)])
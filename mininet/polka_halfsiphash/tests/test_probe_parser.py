@@ -0,0 +1,98 @@
+import pytest
+from scapy.layers.inet import ICMP, IP, TCP, UDP, IPOption_NOP
+from scapy.layers.l2 import Ether
+
+from ..script.headers import POLKA_PROTO, PROBE_VERSION, Polka, PolkaProbe
+from ..script.probe_parser import IP_PROTO_ICMP, IP_PROTO_TCP, IP_PROTO_UDP, parse_probe
+
+ROUTE_ID = 0x1234_5678_9ABC_DEF0_1122_3344_5566_7788_99AA_BBCC
+
+
+def _frame(l4, version=PROBE_VERSION, **ip):
+    return bytes(
+        Ether(src="00:00:00:00:00:01", dst="00:00:00:00:00:02")
+        / Polka(version=version, ttl=64, proto=0x0800, route_id=ROUTE_ID)
+        / PolkaProbe(timestamp=0xDEADBEEF, l_hash=0x01020304)
+        / IP(src="10.0.1.1", dst="10.0.3.3", **ip)
+        / l4
+    )
+
+
+def _expected(frame):
+    """Fields of `frame` as Scapy dissects them"""
+    pkt = Ether(frame)
+    polka, probe, ip = pkt[Polka], pkt[PolkaProbe], pkt[IP]
+    expected = {
+        "ethertype": pkt.type,
+        "version": polka.version,
+        "ttl": polka.ttl,
+        "proto": polka.proto,
+        "route_id": polka.route_id,
+        "timestamp": probe.timestamp,
+        "l_hash": probe.l_hash,
+        "ip_src": ip.src,
+        "ip_dst": ip.dst,
+        "ip_proto": ip.proto,
+        "sport": 0,
+        "dport": 0,
+        "icmp_type": None,
+    }
+    if TCP in pkt or UDP in pkt:
+        l4 = pkt[TCP] if TCP in pkt else pkt[UDP]
+        expected.update(sport=l4.sport, dport=l4.dport)
+    elif ICMP in pkt:
+        expected.update(icmp_type=pkt[ICMP].type)
+    return expected
+
+
+@pytest.mark.parametrize(
+    "l4, ip_proto",
+    [
+        (TCP(sport=40000, dport=5001), IP_PROTO_TCP),
+        (UDP(sport=40001, dport=5002), IP_PROTO_UDP),
+        (ICMP(type=8), IP_PROTO_ICMP),
+        (ICMP(type=0), IP_PROTO_ICMP),
+    ],
+    ids=["tcp", "udp", "icmp-request", "icmp-reply"],
+)
+def test_matches_scapy(l4, ip_proto):
+    frame = _frame(l4)
+    probe = parse_probe(frame)
+    assert probe is not None
+    assert probe.ip_proto == ip_proto and probe.ethertype == POLKA_PROTO
+    assert probe._asdict() == _expected(frame)
+    # Same result over a view of the buffer
+    assert parse_probe(memoryview(bytearray(frame))) == probe
+
+
+def test_ip_options_move_the_ports():
+    frame = _frame(TCP(sport=1234, dport=80), options=[IPOption_NOP()] * 4)
+    assert Ether(frame)[IP].ihl == 6
+    assert parse_probe(frame)._asdict() == _expected(frame)
+
+
+def test_truncated_frames():
+    frame = _frame(TCP(sport=40000, dport=5001))
+    ip_offset = 14 + 24 + 8
+
+    # Cut inside the IP header: not a probe
+    assert parse_probe(frame[: ip_offset + 19]) is None
+    assert parse_probe(frame[:ip_offset]) is None
+    assert parse_probe(b"") is None
+
+    # Cut inside the ports: the probe fields are kept, the ports are not read
+    probe = parse_probe(frame[: ip_offset + 20 + 3])
+    assert probe is not None and (probe.sport, probe.dport) == (0, 0)
+    assert probe.route_id == ROUTE_ID
+
+    # ICMP without its type byte
+    frame = _frame(ICMP(type=8))
+    probe = parse_probe(frame[: ip_offset + 20])
+    assert probe is not None and probe.ip_proto == IP_PROTO_ICMP and probe.icmp_type is None
+
+
+def test_not_a_probe():
+    assert parse_probe(_frame(ICMP(type=8), version=0x01)) is None
+    frame = bytearray(_frame(ICMP(type=8)))
+    frame[12:14] = (0x0800).to_bytes(2, "big")
+    assert parse_probe(frame) is None
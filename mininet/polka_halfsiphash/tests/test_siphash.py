@@ -0,0 +1,52 @@
+import random
+
+import numpy as np
+
+from ..script.siphash import siphash, siphash_batch, siphash_state, siphash_words
+
+# (key, datum, digest) computed with the original `State`-based implementation
+KNOWN_DIGESTS = [
+    (10499958131665514997, 3639700191, "f942617f"),
+    (14089154938208861744, 271041745, "7c408945"),
+    (2175216119781798972, 2127877499, "effb4e2e"),
+    (8291646586825371460, 2028277857, "2c002f9e"),
+]
+
+
+def _random_pairs(n, seed=0):
+    rng = random.Random(seed)
+    edges = [(0, 0), ((1 << 64) - 1, (1 << 32) - 1), (1 << 63, 1), (1, 1 << 31)]
+    return edges + [(rng.getrandbits(64), rng.getrandbits(32)) for _ in range(n)]
+
+
+def test_known_digests():
+    for key, datum, digest in KNOWN_DIGESTS:
+        assert siphash(key.to_bytes(8, "big"), datum.to_bytes(4, "big")).hex() == digest
+
+
+def test_siphash_matches_state_reference():
+    for key, datum in _random_pairs(500):
+        key_bytes, data = key.to_bytes(8, "big"), datum.to_bytes(4, "big")
+        assert siphash(key_bytes, data) == siphash_state(key_bytes, data)
+        assert siphash_words(key >> 32, key & 0xFFFF_FFFF, data) == siphash_state(key_bytes, data)
+
+
+def test_siphash_batch_matches_scalar():
+    pairs = _random_pairs(2000, seed=1)
+    keys = [key for key, _ in pairs]
+    data = [datum for _, datum in pairs]
+
+    result = siphash_batch(keys, data)
+
+    assert result.dtype == np.uint32
+    expected = [int.from_bytes(siphash(k.to_bytes(8, "big"), d.to_bytes(4, "big")), "big") for k, d in pairs]
+    assert result.tolist() == expected
+
+
+def test_siphash_batch_broadcasts_a_single_key():
+    key = KNOWN_DIGESTS[0][0]
+    data = [datum for _, datum in _random_pairs(100, seed=2)]
+
+    result = siphash_batch(key, data)
+
+    assert result.tolist() == [int.from_bytes(siphash(key.to_bytes(8, "big"), d.to_bytes(4, "big")), "big") for d in data]
@@ -0,0 +1,160 @@
+import os
+import pickle
+import random
+import threading
+import time
+
+import pytest
+
+from ..script.submit_queue import DROP_OLDEST, SPILL, SubmissionQueue
+
+
+def _payload(key, seq):
+    # Module level, so spilled submissions can be pickled
+    return {"key": key, "seq": seq}
+
+
+class Recorder:
+    """`send` that keeps what was posted, and can be held on a given payload"""
+
+    def __init__(self, delay=0.0):
+        self.sent = []
+        self.delay = delay
+        self.hold_on = None
+        self.held = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, path, data):
+        if self.delay:
+            time.sleep(random.uniform(0, self.delay))
+        if (data["key"], data["seq"]) == self.hold_on:
+            self.held.set()
+            assert self.release.wait(5)
+        with self._lock:
+            self.sent.append((data["key"], data["seq"]))
+
+    def hold(self, key, seq):
+        self.hold_on = (key, seq)
+
+    def of(self, key):
+        return [seq for k, seq in self.sent if k == key]
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "❌ Timed out"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("batch_size", [1, 8])
+def test_keeps_the_order_of_each_key(batch_size):
+    send = Recorder(delay=0.001)
+    send_batch = (lambda batch: [send(path, data) for path, data in batch]) if batch_size > 1 else None
+    submissions = SubmissionQueue(send, workers=4, maxsize=16, send_batch=send_batch, batch_size=batch_size)
+
+    keys = [f"flow-{i}" for i in range(12)]
+    for seq in range(30):
+        for key in keys:
+            submissions.submit(key, "/probe", _payload, key, seq)
+    submissions.join()
+    submissions.stop()
+
+    assert len(send.sent) == len(keys) * 30
+    for key in keys:
+        assert send.of(key) == list(range(30)), key
+    assert submissions.stats()["sent"] == len(keys) * 30
+
+
+def test_drop_oldest():
+    send = Recorder()
+    send.hold("a", 0)
+    submissions = SubmissionQueue(send, workers=1, maxsize=2, policy=DROP_OLDEST)
+
+    submissions.submit("a", "/probe", _payload, "a", 0)
+    assert send.held.wait(5)
+    # The worker is busy with 0, and only 2 fit in the queue
+    for seq in range(1, 6):
+        assert submissions.submit("a", "/probe", _payload, "a", seq)
+    assert submissions.depth() == 2
+
+    send.release.set()
+    submissions.join()
+    submissions.stop()
+    assert send.of("a") == [0, 4, 5]
+    assert submissions.stats()["dropped"] == 3
+
+
+def test_spill_and_replay_in_order(tmp_path):
+    spill_path = str(tmp_path / "submissions.spill")
+    send = Recorder()
+    send.hold("a", 0)
+    submissions = SubmissionQueue(send, workers=1, maxsize=1, policy=SPILL, spill_path=spill_path)
+
+    assert submissions.submit("a", "/probe", _payload, "a", 0)
+    assert send.held.wait(5)
+    assert submissions.submit("a", "/probe", _payload, "a", 1)
+    # Queue full: spilled, and so is whatever comes next for these flows, even with room again
+    assert not submissions.submit("a", "/probe", _payload, "a", 2)
+    assert not submissions.submit("b", "/probe", _payload, "b", 0)
+    assert os.path.exists(spill_path)
+
+    # The replay is held on a:3, while a:4 arrives
+    send.held.clear()
+    send.release.set()
+    _wait(lambda: send.of("a") == [0, 1])
+    assert not submissions.submit("a", "/probe", _payload, "a", 3)
+    assert submissions.submit("c", "/probe", _payload, "c", 0)
+    send.release.clear()
+    send.hold("a", 3)
+    assert send.held.wait(5)
+    assert not submissions.submit("a", "/probe", _payload, "a", 4)
+    send.release.set()
+
+    _wait(lambda: len(send.sent) == 7)
+    submissions.stop()
+    assert send.of("a") == [0, 1, 2, 3, 4]
+    assert send.of("b") == [0]
+    assert not os.path.exists(spill_path) and not os.path.exists(spill_path + ".replay")
+    stats = submissions.stats()
+    assert (stats["spilled"], stats["replayed"], stats["sent"]) == (4, 4, 7)
+
+
+def test_stop_posts_what_is_pending():
+    send = Recorder(delay=0.002)
+    submissions = SubmissionQueue(send, workers=2, maxsize=100)
+    for seq in range(50):
+        submissions.submit(f"flow-{seq % 3}", "/probe", _payload, f"flow-{seq % 3}", seq)
+    submissions.stop()
+
+    assert len(send.sent) == 50
+    assert submissions.depth() == 0
+    # Later submissions start the workers again
+    submissions.submit("flow-0", "/probe", _payload, "flow-0", 50)
+    submissions.stop()
+    assert send.of("flow-0")[-1] == 50
+
+
+def _write_spill(path, records):
+    with open(path, "ab") as f:
+        for key, seq in records:
+            pickle.dump((key, "/probe", _payload, (key, seq)), f)
+
+
+def test_recovers_an_interrupted_replay(tmp_path):
+    spill_path = str(tmp_path / "submissions.spill")
+    # A replay the previous run did not finish, and what was spilled after it started
+    _write_spill(spill_path + ".replay", [("a", 0), ("b", 0), ("a", 1)])
+    _write_spill(spill_path, [("a", 2), ("b", 1)])
+
+    send = Recorder()
+    submissions = SubmissionQueue(send, workers=1, maxsize=10, policy=SPILL, spill_path=spill_path)
+    assert not os.path.exists(spill_path + ".replay")
+    # Flows of both files keep their order behind the spill
+    assert not submissions.submit("b", "/probe", _payload, "b", 2)
+
+    _wait(lambda: len(send.sent) == 6)
+    submissions.stop()
+    assert send.sent == [("a", 0), ("b", 0), ("a", 1), ("a", 2), ("b", 1), ("b", 2)]
+    assert not os.path.exists(spill_path)
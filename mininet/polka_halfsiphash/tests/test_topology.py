@@ -0,0 +1,74 @@
+import pytest
+
+from ..script.polka_route import compile_route
+from ..script.registry import LINEAR, SIMPLE
+from ..script.topology import Topology
+from ..script.utils import resolve_path
+
+
+def _wiring(topology):
+    return {node.name: [neighbor.name if neighbor is not None else None for neighbor in node.ports] for node in topology.nodes}
+
+
+@pytest.mark.parametrize(
+    "topology", [LINEAR, SIMPLE, Topology.linear(5), Topology.ring(6), Topology.fat_tree(4)], ids=repr
+)
+def test_dict_and_file_round_trip(topology, tmp_path):
+    copy = Topology.from_dict(topology.to_dict())
+    assert copy.to_dict() == topology.to_dict()
+    assert [(node.name, node.node_id) for node in copy.nodes] == [(node.name, node.node_id) for node in topology.nodes]
+    assert _wiring(copy) == _wiring(topology)
+
+    path = tmp_path / "topology.json"
+    topology.to_file(str(path))
+    assert Topology.from_file(str(path)).to_dict() == topology.to_dict()
+
+
+def test_from_dict_accepts_int_and_hex_node_ids():
+    topology = Topology.from_dict({"nodes": [["a", 0x2B], ["b", "0x002D"]], "links": [["a", 2, "b", 2]]})
+    assert [node.node_id for node in topology.nodes] == [0x2B, 0x2D]
+    assert topology.node("a").ports[2] is topology.node("b")
+
+
+def test_ring():
+    n = 6
+    topology = Topology.ring(n)
+    assert len(topology.links()) == n
+    for i in range(1, n + 1):
+        node, following = topology.node(f"s{i}"), topology.node(f"s{i % n + 1}")
+        assert node.ports[3] is following and following.ports[2] is node
+
+
+def test_fat_tree():
+    k = 4
+    half = k // 2
+    topology = Topology.fat_tree(k)
+    n_edge = n_agg = k * half
+    assert len(topology) == n_edge + n_agg + half * half
+    # Every edge switch links to the k/2 aggregation switches of its pod, which link to k/2 core switches each
+    assert len(topology.links()) == k * half * half * 2
+
+    for i, node in enumerate(topology.nodes):
+        neighbors = [neighbor for neighbor in node.ports if neighbor is not None]
+        assert len(neighbors) == (half if i < n_edge else k), node.name
+        # Links go both ways
+        for port, neighbor in enumerate(node.ports):
+            if neighbor is not None:
+                assert node in neighbor.ports, (node.name, port)
+
+    # Edge of pod 0 to edge of the last pod, through aggregation and core
+    edge_a, agg_a = topology.node("s1"), topology.node(f"s{1 + n_edge}")
+    core = agg_a.ports[2 + half]
+    agg_b = core.ports[2 + k - 1]
+    edge_b = agg_b.ports[2]
+    path = [(edge_a, 2), (agg_a, 2 + half), (core, 2 + k - 1), (agg_b, 2), (edge_b, 1)]
+    route_id = compile_route(path)
+    assert resolve_path(route_id, edge_a, topology.version) == tuple((node.node_id, port) for node, port in path)
+
+
+@pytest.mark.parametrize("topology", [LINEAR, Topology.ring(5), Topology.fat_tree(4)], ids=repr)
+def test_group_matches_nodes(topology):
+    route_ids = [0, 12345, 2**160 + 99, LINEAR.node("s1").node_id << 40]
+    ports = topology.group.nhop_many(route_ids)
+    for route_id, row in zip(route_ids, ports):
+        assert list(row) == [node.nhop(route_id) for node in topology.nodes]
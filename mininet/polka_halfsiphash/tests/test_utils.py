@@ -0,0 +1,47 @@
+from itertools import islice
+
+import pytest
+
+from ..script.polka_route import compile_route, irreducible_node_ids
+from ..script.topology import Topology
+from ..script.utils import invalidate_paths, resolve_path, _resolve_path
+
+
+def _topology():
+    """s1 - s2, with s3 not linked yet"""
+    ids = list(islice(irreducible_node_ids(), 3))
+    return Topology("t", [("s1", ids[0]), ("s2", ids[1]), ("s3", ids[2])], [("s1", 2, "s2", 2)])
+
+
+def test_add_links_changes_the_cache_key():
+    topology = _topology()
+    s1, s2, s3 = (topology.node(name) for name in ("s1", "s2", "s3"))
+    to_s2 = compile_route([(s1, 2), (s2, 1)])
+    to_s3 = compile_route([(s1, 2), (s2, 3), (s3, 1)])
+
+    # Port 3 of s2 leads nowhere yet
+    with pytest.raises(Exception):
+        resolve_path(to_s3, s1, topology.version)
+    resolve_path(to_s2, s1, topology.version)
+
+    version = topology.version
+    topology.add_links([("s2", 3, "s3", 2)])
+    assert topology.version != version
+
+    misses = _resolve_path.cache_info().misses
+    assert resolve_path(to_s2, s1, topology.version) == ((s1.node_id, 2), (s2.node_id, 1))
+    assert _resolve_path.cache_info().misses == misses + 1
+    assert resolve_path(to_s3, s1, topology.version) == ((s1.node_id, 2), (s2.node_id, 3), (s3.node_id, 1))
+
+
+def test_invalidate_paths_after_rewiring_by_hand():
+    topology = _topology()
+    s1, s2, s3 = (topology.node(name) for name in ("s1", "s2", "s3"))
+    route = compile_route([(s1, 2), (s2, 1), (s3, 1)])
+    assert resolve_path(route, s1, topology.version) == ((s1.node_id, 2), (s2.node_id, 1))
+
+    # Same version: the cached path is served until the cache is dropped
+    s1.ports[2] = s3
+    assert resolve_path(route, s1, topology.version) == ((s1.node_id, 2), (s2.node_id, 1))
+    invalidate_paths()
+    assert resolve_path(route, s1, topology.version) == ((s1.node_id, 2), (s3.node_id, 1))
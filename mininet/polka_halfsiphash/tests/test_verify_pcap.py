@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from scapy.layers.inet import ICMP, IP
+from scapy.layers.l2 import Ether
+from scapy.utils import wrpcap
+
+from ..script.headers import PROBE_VERSION, Polka, PolkaProbe
+from ..script.utils import calc_digests, polka_route_ids
+from ..script.verify_pcap import iter_probes, main, verify
+
+ROUTE_ID = polka_route_ids["h1"]["h3"]
+
+
+def _probe(src, timestamp, l_hash, icmp_type=8):
+    return (
+        Ether(src="00:00:00:00:00:01", dst="00:00:00:00:00:02")
+        / Polka(version=PROBE_VERSION, ttl=64, proto=0x0800, route_id=ROUTE_ID)
+        / PolkaProbe(timestamp=timestamp, l_hash=l_hash)
+        / IP(src=src, dst="10.0.3.3")
+        / ICMP(type=icmp_type)
+    )
+
+
+def _egress_hash(timestamp):
+    return int.from_bytes(calc_digests(ROUTE_ID, "e1", timestamp)[-1], "big")
+
+
+@pytest.fixture
+def capture(tmp_path):
+    """Two flows on the h1 -> h3 route of the linear topology, entering on e1"""
+    frames = [
+        # 10.0.1.1: one success, one fail, one probe without reference
+        _probe("10.0.1.1", 1, 1),
+        _probe("10.0.1.1", 1, _egress_hash(1)),
+        _probe("10.0.1.1", 2, 2),
+        _probe("10.0.1.1", 2, _egress_hash(2) ^ 1),
+        _probe("10.0.1.1", 3, _egress_hash(3)),
+        # 10.0.1.2: two successes, and an echo reply that is not a probe
+        _probe("10.0.1.2", 1, 1),
+        _probe("10.0.1.2", 4, 4),
+        _probe("10.0.1.2", 4, _egress_hash(4)),
+        _probe("10.0.1.2", 1, _egress_hash(1)),
+        _probe("10.0.1.2", 5, _egress_hash(5), icmp_type=0),
+    ]
+    path = tmp_path / "probes.pcap"
+    wrpcap(str(path), frames)
+    return str(path)
+
+
+def _by_source(path, summary):
+    """Summary keyed by source address instead of flow id"""
+    flows = {}
+    for flow_id, *_ in iter_probes([path]):
+        flows.setdefault(flow_id, len(flows))
+    sources = {flow_id: f"10.0.1.{i + 1}" for flow_id, i in flows.items()}
+    return {sources[flow_id]: dict(counts) for flow_id, counts in summary.items()}
+
+
+def test_counts_per_flow(capture):
+    assert len(list(iter_probes([capture]))) == 9
+    summary = verify(iter_probes([capture]))
+    assert _by_source(capture, summary) == {
+        "10.0.1.1": {"success": 1, "fail": 1, "nil": 1},
+        "10.0.1.2": {"success": 2, "fail": 0, "nil": 0},
+    }
+
+
+def test_window_evicts_the_oldest_references(tmp_path):
+    frames = [_probe("10.0.1.1", t, t) for t in (10, 11, 12)]
+    frames += [_probe("10.0.1.1", t, _egress_hash(t)) for t in (10, 11, 12)]
+    path = tmp_path / "window.pcap"
+    wrpcap(str(path), frames)
+
+    # Only the 2 newest references are still pending when the egress probes arrive
+    (counts,) = verify(iter_probes([str(path)]), window=2).values()
+    assert dict(counts) == {"success": 2, "fail": 0, "nil": 1}
+    (counts,) = verify(iter_probes([str(path)])).values()
+    assert dict(counts) == {"success": 3, "fail": 0, "nil": 0}
+
+
+def test_main_json(capture, capsys):
+    main([capture, "--json"])
+    summary = json.loads(capsys.readouterr().out)
+    assert sorted(tuple(counts.values()) for counts in summary.values()) == [(1, 1, 1), (2, 0, 0)]